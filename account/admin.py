@@ -1,5 +1,44 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.utils.translation import gettext_lazy as _
+from shop.admin import LargeTableAdmin
 from .models import Account, Wishlist
 
-admin.site.register(Account)
-admin.site.register(Wishlist)
+
+@admin.register(Account)
+class AccountAdmin(LargeTableAdmin, UserAdmin):
+    fieldsets = UserAdmin.fieldsets + (
+        (
+            _("Billing address"),
+            {
+                "fields": (
+                    "billing_address_line1",
+                    "billing_address_line2",
+                    "billing_city",
+                    "billing_postal_code",
+                    "billing_country",
+                )
+            },
+        ),
+        (
+            _("Shipping address"),
+            {
+                "fields": (
+                    "shipping_address_line1",
+                    "shipping_address_line2",
+                    "shipping_city",
+                    "shipping_postal_code",
+                    "shipping_country",
+                )
+            },
+        ),
+    )
+    search_fields = ["username__exact", "email__exact"]
+
+
+@admin.register(Wishlist)
+class WishlistAdmin(LargeTableAdmin):
+    list_display = ["__str__", "account"]
+    list_select_related = ["account"]
+    search_fields = ["account__username__exact", "account__email__exact"]
+    raw_id_fields = ["account", "product"]
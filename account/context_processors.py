@@ -1,12 +1,9 @@
-from account.models import Wishlist, Account
+from .counter import wishlist_count
 
 
 def wishlist_info(request):
-    """Get the total count of products inside Wishlist."""
-    try:
-        account = Account.objects.get(username=request.user)
-        wishlist = Wishlist.objects.get(account=account)
-        count = wishlist.count()
-    except (Account.DoesNotExist, Wishlist.DoesNotExist):
-        count = 0
-    return {"wishlist_count": count}
+    """Get the total count of products inside the account Wishlist."""
+    user = request.user
+    if not user.is_authenticated:
+        return {"wishlist_count": 0}
+    return {"wishlist_count": wishlist_count.get(user.pk)}
@@ -0,0 +1,12 @@
+from shop.counter import KeyedCounter
+
+
+def _count_wishlist_products(account_id):
+    from .models import Wishlist
+
+    return Wishlist.product.through.objects.filter(
+        wishlist__account_id=account_id
+    ).count()
+
+
+wishlist_count = KeyedCounter("wishlist:count", _count_wishlist_products)
@@ -0,0 +1,27 @@
+from functools import partial
+from django.utils.functional import SimpleLazyObject
+from .models import Wishlist
+
+
+def get_wishlist(request):
+    """Return the wishlist of the logged in account, looked up once per request.
+
+    A new account's wishlist stays unsaved until its first add. Anonymous
+    visitors get None.
+    """
+    if not request.user.is_authenticated:
+        return None
+    if not hasattr(request, "_wishlist"):
+        request._wishlist = Wishlist.for_account(request.user)
+    return request._wishlist
+
+
+class WishlistMiddleware:
+    """Expose the account wishlist as a lazy request.wishlist."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.wishlist = SimpleLazyObject(partial(get_wishlist, request))
+        return self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0001_initial"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="account",
+            index=models.Index(fields=["email"], name="account_email_idx"),
+        ),
+    ]
@@ -42,6 +42,10 @@ class Account(AbstractUser):
     def __str__(self):
         return self.username
 
+    class Meta(AbstractUser.Meta):
+        # Serves the exact email search of the admin.
+        indexes = [models.Index(fields=["email"], name="account_email_idx")]
+
 
 class Wishlist(models.Model):
     """Represents a Wishlist where Account can add items."""
@@ -49,21 +53,36 @@ class Wishlist(models.Model):
     product = models.ManyToManyField(Product, blank=True)
     account = models.OneToOneField(Account, on_delete=models.CASCADE)
 
-    def add(self, product: Product):
-        """To add a product to the wishlist."""
-        self.product.add(product)
-        self.save()
+    @classmethod
+    def for_account(cls, account):
+        """Return the wishlist of account, unsaved until its first add if new."""
+        return cls.objects.filter(account=account).first() or cls(account=account)
+
+    def products(self):
+        """Returns the products in the wishlist."""
+        if self.pk is None:
+            return Product.objects.none()
+        return self.product.all()
+
+    def add(self, *products: Product):
+        """To add one or more products to the wishlist."""
+        if self.pk is None:
+            # Created on the first add, another request may have beaten us.
+            saved, created = Wishlist.objects.get_or_create(account=self.account)
+            self.pk = saved.pk
+            self._state.adding = False
+        self.product.add(*products)
 
-    def remove(self, product: Product):
-        """To remove a product from the wishlist."""
-        self.product.remove(product)
-        self.save()
+    def remove(self, *products: Product):
+        """To remove one or more products from the wishlist."""
+        if self.pk is not None:
+            self.product.remove(*products)
 
     def clear(self):
         """To clear all products from the wishlist."""
-        self.product.clear()
-        self.save()
+        if self.pk is not None:
+            self.product.clear()
 
     def count(self):
         """Returns the number of products in the wishlist."""
-        return self.product.count()
+        return self.products().count()
@@ -0,0 +1,31 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from .counter import wishlist_count
+from .models import Wishlist
+
+
+@receiver(m2m_changed, sender=Wishlist.product.through)
+def wishlist_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the cached wishlist counts in step once the change is committed.
+
+    Adds bump the count by the products actually added. Removals and clears
+    drop it, to be recounted on next read. Changes made from the product
+    side drop the count of every wishlist involved.
+    """
+    if reverse:
+        if action == "pre_clear":
+            wishlists = instance.wishlist_set.all()
+        elif action in ("post_add", "post_remove"):
+            wishlists = Wishlist.objects.filter(pk__in=pk_set)
+        else:
+            return
+        for account_id in wishlists.values_list("account_id", flat=True):
+            transaction.on_commit(partial(wishlist_count.forget, account_id))
+    elif action == "post_add":
+        transaction.on_commit(
+            partial(wishlist_count.incr, instance.account_id, len(pk_set))
+        )
+    elif action in ("post_remove", "post_clear"):
+        transaction.on_commit(partial(wishlist_count.forget, instance.account_id))
@@ -1,5 +1,13 @@
-from django.test import TestCase
+import math
+from django.core.cache import cache
+from django.db import connection
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .context_processors import wishlist_info
 from .models import Account, Wishlist
+from cart.models import Cart, Order, OrderItem
 from shop.models import Product, Collection
 
 
@@ -89,3 +97,366 @@ class WishlistModelTests(TestCase):
         self.assertEqual(self.wishlist.account, self.account)
         with self.assertRaises(Exception):
             Wishlist.objects.create(account=self.account)
+
+
+@override_settings(ACCOUNT_ORDERS_PAGE_SIZE=3)
+class AccountOrderHistoryTests(TestCase):
+    """To test the paginated order history on the account page."""
+
+    def setUp(self):
+        cache.clear()
+        self.account = Account.objects.create_user(
+            username="juan", email="[email protected]", password="testpass123"
+        )
+        collection = Collection.objects.create(name="Default collection")
+        self.product = Product.objects.create(
+            name="Mug", price_in_cents=1500, collection=collection
+        )
+        self.url = reverse("account:account")
+        self.client.force_login(self.account)
+
+    def create_orders(self, count):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(account=self.account, total_cents=3000)
+            OrderItem.objects.create(
+                order=order, product=self.product, quantity=2, unit_price_cents=1500
+            )
+            orders.append(order)
+        return orders
+
+    def queries_for_page(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, "2x Mug")
+        return len(queries)
+
+    def test_orders_are_paged_newest_first(self):
+        orders = self.create_orders(7)
+        seen = []
+        response = self.client.get(self.url)
+        while True:
+            seen += response.context["orders"]
+            if not response.context["next_cursor"]:
+                break
+            response = self.client.get(
+                self.url, {"after": response.context["next_cursor"]}
+            )
+        self.assertEqual(seen, orders[::-1])
+
+    def test_page_query_count_is_fixed(self):
+        self.create_orders(2)
+        few = self.queries_for_page()
+        self.create_orders(40)
+        self.assertEqual(self.queries_for_page(), few)
+
+
+class AccountAdminChangelistTests(TestCase):
+    """Test the account changelists stay at a fixed query count at 100k rows."""
+
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Account.objects.create_superuser(
+            username="admin", email="[email protected]", password="testpass123"
+        )
+        accounts = Account.objects.bulk_create(
+            Account(username=f"user{i}", email=f"user{i}@example.com")
+            for i in range(cls.ROWS)
+        )
+        Wishlist.objects.bulk_create(Wishlist(account=account) for account in accounts)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueries(self, model, num, params=None):
+        url = reverse(f"admin:account_{model}_changelist")
+        self.client.get(url, params)
+        with self.assertNumQueries(num):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+    def test_account_changelist(self):
+        # Session, user, estimated count, page and the groups filter.
+        self.assertChangelistQueries("account", 5)
+
+    def test_account_changelist_search(self):
+        self.assertChangelistQueries("account", 5, {"q": "user5@example.com"})
+
+    def test_wishlist_changelist(self):
+        self.assertChangelistQueries("wishlist", 4)
+
+
+class WishlistFragmentTests(TestCase):
+    """Test the htmx and JSON wishlist responses."""
+
+    def setUp(self):
+        cache.clear()
+        self.account = Account.objects.create_user(
+            username="juan", email="[email protected]", password="testpass123"
+        )
+        self.wishlist = Wishlist.objects.create(account=self.account)
+        self.cart = Cart.objects.create(account=self.account)
+        collection = Collection.objects.create(name="Default collection")
+        self.product = Product.objects.create(
+            name="Mug", price_in_cents=1500, quantity=5, collection=collection
+        )
+        self.client.force_login(self.account)
+
+    def test_htmx_add_returns_the_message_and_wishlist_badge(self):
+        response = self.client.post(
+            reverse("account:add_to_wishlist", args=[self.product.id]),
+            headers={"HX-Request": "true"},
+        )
+        self.assertNotContains(response, "<html")
+        self.assertNotContains(response, "cart-badge")
+        self.assertRegex(
+            response.text,
+            r'id="wishlist-badge"\s+hx-swap-oob="true"[^>]*>\s*1\s*</span>',
+        )
+        self.assertContains(response, "Added Mug to wishlist.")
+        self.assertIn(self.product, self.wishlist.product.all())
+
+    def test_forms_post_through_htmx(self):
+        self.wishlist.add(self.product)
+        add_url = reverse("account:add_to_wishlist", args=[self.product.id])
+        product_page = self.client.get(reverse("shop:product", args=[self.product.id]))
+        self.assertContains(product_page, f'hx-post="{add_url}"')
+        transfer_url = reverse("account:transfer_to_cart", args=[self.product.id])
+        wishlist_page = self.client.get(reverse("account:wishlist_detail"))
+        self.assertContains(wishlist_page, f'hx-post="{transfer_url}"')
+        self.assertContains(
+            wishlist_page, f'hx-target="#wishlist-line-{self.product.id}"'
+        )
+
+    def test_json_transfer_returns_the_cart_count(self):
+        self.wishlist.add(self.product)
+        response = self.client.post(
+            reverse("account:transfer_to_cart", args=[self.product.id]),
+            headers={"Accept": "application/json"},
+        )
+        self.assertEqual(response.json()["cart_count"], 1)
+        self.assertEqual(response.json()["product_id"], self.product.id)
+        self.assertEqual(response.json()["wishlist_count"], 0)
+        self.assertEqual(self.wishlist.count(), 0)
+
+
+class WishlistBulkTests(TestCase):
+    """Test moving and removing many wishlist products at once."""
+
+    def setUp(self):
+        self.account = Account.objects.create_user(
+            username="juan", email="[email protected]", password="testpass123"
+        )
+        self.wishlist = Wishlist.objects.create(account=self.account)
+        self.cart = Cart.objects.create(account=self.account)
+        collection = Collection.objects.create(name="Default collection")
+        self.products = Product.objects.bulk_create(
+            Product(
+                name=f"Piece {i}",
+                price_in_cents=1500,
+                quantity=5,
+                image="products/test.jpg",
+                collection=collection,
+            )
+            for i in range(500)
+        )
+
+    def test_add_and_remove_do_not_write_the_wishlist_row(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.wishlist.add(*self.products[:3])
+            self.wishlist.remove(self.products[0], self.products[1])
+        self.assertFalse([q for q in queries.captured_queries if "UPDATE" in q["sql"]])
+        self.assertEqual(self.wishlist.count(), 1)
+
+    def test_move_to_cart_query_count_does_not_grow(self):
+        for size in (1, 50, 500):
+            with self.subTest(size=size):
+                self.wishlist.add(*self.products[:size])
+                # SQLite caps bound parameters, so large inserts are batched.
+                batch = connection.ops.bulk_batch_size(
+                    ["cart", "product", "quantity"], range(size)
+                )
+                inserts = math.ceil(size / batch)
+                # Savepoint, wishlist lines, cart inserts, line delete, release.
+                with self.assertNumQueries(4 + inserts):
+                    moved = self.cart.move_from_wishlist(self.wishlist)
+                self.assertEqual(len(moved), size)
+                self.assertEqual(self.wishlist.count(), 0)
+                self.assertEqual(self.cart.items().count(), size)
+
+    def test_move_keeps_quantities_already_in_the_cart(self):
+        self.cart.add(self.products[0], quantity=3)
+        self.wishlist.add(*self.products[:2])
+        self.cart.move_from_wishlist(self.wishlist)
+        self.assertEqual(
+            dict(self.cart.items().values_list("product_id", "quantity")),
+            {self.products[0].pk: 3, self.products[1].pk: 1},
+        )
+
+    def test_move_selected_and_all_views(self):
+        self.client.force_login(self.account)
+        self.wishlist.add(*self.products[:4])
+        url = reverse("account:move_to_cart")
+
+        self.client.post(url, {"product": [self.products[0].pk, self.products[1].pk]})
+        self.assertEqual(self.wishlist.count(), 2)
+        self.assertEqual(self.cart.items().count(), 2)
+
+        response = self.client.post(url, {"all": "1"})
+        self.assertRedirects(
+            response, reverse("cart:cart"), fetch_redirect_response=False
+        )
+        self.assertEqual(self.wishlist.count(), 0)
+        self.assertEqual(self.cart.items().count(), 4)
+
+    def test_remove_selected_view(self):
+        self.client.force_login(self.account)
+        self.wishlist.add(*self.products[:3])
+        self.client.post(
+            reverse("account:remove_selected_from_wishlist"),
+            {"product": [self.products[0].pk, self.products[2].pk]},
+        )
+        self.assertEqual(list(self.wishlist.product.all()), [self.products[1]])
+
+    def test_transfer_of_a_product_not_in_the_wishlist_is_404(self):
+        self.client.force_login(self.account)
+        response = self.client.post(
+            reverse("account:transfer_to_cart", args=[self.products[0].pk])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_wishlist_page_renders_the_selection_form(self):
+        self.client.force_login(self.account)
+        self.wishlist.add(self.products[0])
+        response = self.client.get(reverse("account:wishlist_detail"))
+        self.assertContains(response, 'form="wishlist-selection"', count=4)
+
+
+class WishlistCountTests(TestCase):
+    """Test the cached wishlist count behind the nav badge."""
+
+    def setUp(self):
+        cache.clear()
+        self.account = Account.objects.create_user(
+            username="juan", email="[email protected]", password="testpass123"
+        )
+        self.wishlist = Wishlist.objects.create(account=self.account)
+        collection = Collection.objects.create(name="Default collection")
+        self.product1 = Product.objects.create(
+            name="Mug", price_in_cents=1500, collection=collection
+        )
+        self.product2 = Product.objects.create(
+            name="Plate", price_in_cents=2500, collection=collection
+        )
+        self.factory = RequestFactory()
+
+    def count(self, user=None):
+        request = self.factory.get("/")
+        request.user = user or self.account
+        return wishlist_info(request)["wishlist_count"]
+
+    def test_anonymous_users_run_no_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(AnonymousUser()), 0)
+
+    def test_count_is_read_once_then_cached(self):
+        self.wishlist.add(self.product1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(), 1)
+
+    def test_add_updates_the_cached_count(self):
+        self.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wishlist.add(self.product1, self.product2)
+            self.wishlist.add(self.product1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(), 2)
+
+    def test_remove_and_clear_drop_the_cached_count(self):
+        self.wishlist.add(self.product1, self.product2)
+        self.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wishlist.remove(self.product1)
+        self.assertEqual(self.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.wishlist.clear()
+        self.assertEqual(self.count(), 0)
+
+    def test_changes_from_the_product_side_drop_the_cached_count(self):
+        self.wishlist.add(self.product1)
+        self.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product1.wishlist_set.clear()
+        self.assertEqual(self.count(), 0)
+
+    def test_move_to_cart_drops_the_cached_count(self):
+        self.wishlist.add(self.product1)
+        self.count()
+        Cart.objects.create(account=self.account).move_from_wishlist(self.wishlist)
+        self.assertEqual(self.count(), 0)
+
+    def test_nav_shows_the_count(self):
+        self.wishlist.add(self.product1, self.product2)
+        self.client.force_login(self.account)
+        response = self.client.get(reverse("account:account"))
+        self.assertEqual(response.context["wishlist_count"], 2)
+
+
+class LazyWishlistTests(TestCase):
+    """Test that the request wishlist is only created on its first add."""
+
+    def setUp(self):
+        cache.clear()
+        self.account = Account.objects.create_user(
+            username="juan", email="[email protected]", password="testpass123"
+        )
+        collection = Collection.objects.create(name="Default collection")
+        self.product = Product.objects.create(
+            name="Mug", price_in_cents=1500, collection=collection
+        )
+        self.client.force_login(self.account)
+
+    def test_signup_creates_no_cart_or_wishlist(self):
+        self.client.logout()
+        response = self.client.post(
+            reverse("account:registration_submit"),
+            {
+                "username": "ana",
+                "first_name": "Ana",
+                "last_name": "Lopez",
+                "email": "ana@example.com",
+                "password1": "a-Strong-pass-91",
+                "password2": "a-Strong-pass-91",
+            },
+        )
+        self.assertRedirects(response, reverse("account:login"))
+        account = Account.objects.get(username="ana")
+        self.assertFalse(Wishlist.objects.filter(account=account).exists())
+        self.assertFalse(Cart.objects.filter(account=account).exists())
+
+    def test_viewing_an_empty_wishlist_creates_no_row(self):
+        response = self.client.get(reverse("account:wishlist_detail"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Wishlist.objects.exists())
+
+    def test_first_add_creates_the_wishlist(self):
+        self.client.post(reverse("account:add_to_wishlist", args=[self.product.id]))
+        wishlist = Wishlist.objects.get(account=self.account)
+        self.assertEqual(list(wishlist.product.all()), [self.product])
+
+    def test_removing_from_a_missing_wishlist_is_a_no_op(self):
+        response = self.client.post(
+            reverse("account:remove_from_wishlist", args=[self.product.id])
+        )
+        self.assertRedirects(response, reverse("account:wishlist_detail"))
+        self.assertFalse(Wishlist.objects.exists())
+
+    def test_moving_a_missing_wishlist_creates_no_cart(self):
+        response = self.client.post(reverse("account:move_to_cart"), {"all": "1"})
+        self.assertRedirects(response, reverse("account:wishlist_detail"))
+        self.assertFalse(Cart.objects.exists())
@@ -19,6 +19,12 @@ urlpatterns = [
         name="remove_from_wishlist",
     ),
     path("wishlist/clear/", views.clear_wishlist, name="clear_wishlist"),
+    path(
+        "wishlist/remove/",
+        views.remove_selected_from_wishlist,
+        name="remove_selected_from_wishlist",
+    ),
+    path("wishlist/move/", views.move_to_cart, name="move_to_cart"),
     path(
         "wishlist/transfer/<int:product_id>",
         views.transfer_to_cart,
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from .counter import wishlist_count
 from .forms import RegistrationForm, LoginForm, ShippingForm, BillingForm
-from cart.models import Cart
+from cart.fragments import fragment_response, wants_fragment
+from cart.helpers import get_cart_summary, merge_session_cart
 from shop.models import Product
-from .models import Wishlist
+from shop.pagination import paginate_keyset
 from django.contrib import messages
+from django.http import Http404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST, require_GET
 from django.contrib.auth import (
@@ -29,9 +33,7 @@ def registration_submit(request):
 
     form = RegistrationForm(request.POST)
     if form.is_valid():
-        user = form.save()
-        Wishlist.objects.create(account=user)
-        Cart.objects.create(account=user)
+        form.save()
         msg = "Your account has properly been created."
         messages.success(request, msg)
         return redirect("account:login")
@@ -62,6 +64,7 @@ def login_submit(request):
         )
         if user:
             auth_login(request, user)
+            merge_session_cart(request)
             msg = "You have Logged in Successfully."
             messages.success(request, msg)
             return redirect("account:account")
@@ -82,12 +85,19 @@ def logout(request):
 
 @login_required(login_url="account:login")
 def account(request):
-    """Display User Account Information."""
+    """Display User Account Information with one page of its orders."""
     account = request.user
-    orders = account.order_set.all()
+    orders = account.order_set.prefetch_related("items__product")
+    page = paginate_keyset(
+        orders,
+        "created_at",
+        request.GET.get("after"),
+        getattr(settings, "ACCOUNT_ORDERS_PAGE_SIZE", 10),
+    )
     context = {
         "account": account,
-        "orders": orders,
+        "orders": page.items,
+        "next_cursor": page.next_cursor,
     }
 
     return render(request, "account/account.html", context)
@@ -97,8 +107,8 @@ def account(request):
 @require_GET
 def wishlist_detail(request):
     """Display the wishlist if the user is logged in."""
-    wishlist = get_object_or_404(Wishlist, account=request.user)
-    wishlist_products = wishlist.product.all()
+    wishlist = request.wishlist
+    wishlist_products = wishlist.products()
 
     context = {
         "wishlist": wishlist,
@@ -112,9 +122,23 @@ def wishlist_detail(request):
 def add_to_wishlist(request, product_id):
     """Adds a product to the wishlist if the user is logged in."""
     product = get_object_or_404(Product, pk=product_id)
-    wishlist = get_object_or_404(Wishlist, account=request.user)
+    wishlist = request.wishlist
     wishlist.add(product)
-    messages.success(request, f"Added {product.name} to wishlist.")
+    message = f"Added {product.name} to wishlist."
+    if wants_fragment(request):
+        count = wishlist_count.get(request.user.pk)
+        return fragment_response(
+            request,
+            "account/partials/wishlist_update.html",
+            {"message": message, "cart_count": None, "wishlist_count": count},
+            {
+                "message": message,
+                "product_id": product.pk,
+                "in_wishlist": True,
+                "wishlist_count": count,
+            },
+        )
+    messages.success(request, message)
     return redirect("shop:product", product_id)
 
 
@@ -123,8 +147,7 @@ def add_to_wishlist(request, product_id):
 def remove_from_wishlist(request, product_id):
     """Removes a product from the wishlist if the user is logged in."""
     product = get_object_or_404(Product, pk=product_id)
-    user = request.user
-    wishlist = get_object_or_404(Wishlist, account=user)
+    wishlist = request.wishlist
     wishlist.remove(product)
     messages.info(request, f"Removed {product.name} from wishlist.")
     return redirect("account:wishlist_detail")
@@ -134,29 +157,78 @@ def remove_from_wishlist(request, product_id):
 @require_POST
 def clear_wishlist(request):
     """Clear the wishlist from all products if the user is logged in."""
-    wishlist = get_object_or_404(Wishlist, account=request.user)
+    wishlist = request.wishlist
     wishlist.clear()
     msg = _("Wishlist cleared.")
     messages.info(request, msg)
     return redirect("account:wishlist_detail")
 
 
+def _selected_products(request):
+    """Product ids ticked in a wishlist selection form."""
+    return [int(pk) for pk in request.POST.getlist("product") if pk.isdigit()]
+
+
 @login_required(login_url="account:login")
 @require_POST
 def transfer_to_cart(request, product_id):
-    """Transfer all the products in the wishlist to the user account related cart."""
-    account = request.user
-    wishlist = Wishlist.objects.get(account=account)
-    cart = get_object_or_404(Cart, account=account)
-    product = wishlist.product.get(pk=product_id)
-    cart.add(product, quantity=1, replace=True)
-    wishlist.remove(product)
+    """Transfer one product from the wishlist to the user account related cart."""
+    wishlist = request.wishlist
+    if not request.cart.move_from_wishlist(wishlist, [product_id]):
+        raise Http404("Product not in wishlist.")
     msg = _("You have succesfully transfer the item to your shopping cart.")
+    if wants_fragment(request):
+        cart_count = get_cart_summary(request).quantity
+        count = wishlist_count.get(request.user.pk)
+        return fragment_response(
+            request,
+            "account/partials/wishlist_update.html",
+            {"message": msg, "cart_count": cart_count, "wishlist_count": count},
+            {
+                "message": str(msg),
+                "product_id": product_id,
+                "cart_count": cart_count,
+                "wishlist_count": count,
+            },
+        )
     messages.success(request, msg)
 
     return redirect("cart:cart")
 
 
+@login_required(login_url="account:login")
+@require_POST
+def move_to_cart(request):
+    """Move the selected products, or the whole wishlist, to the cart."""
+    wishlist = request.wishlist
+    product_ids = None if "all" in request.POST else _selected_products(request)
+    moved = request.cart.move_from_wishlist(wishlist, product_ids)
+    if moved:
+        messages.success(
+            request,
+            _("Moved %(count)d products to your cart.") % {"count": len(moved)},
+        )
+        return redirect("cart:cart")
+    messages.info(request, _("No products selected."))
+    return redirect("account:wishlist_detail")
+
+
+@login_required(login_url="account:login")
+@require_POST
+def remove_selected_from_wishlist(request):
+    """Remove the selected products from the wishlist."""
+    wishlist = request.wishlist
+    product_ids = _selected_products(request)
+    if product_ids:
+        wishlist.remove(*product_ids)
+        messages.info(
+            request,
+            _("Removed %(count)d products from wishlist.")
+            % {"count": len(product_ids)},
+        )
+    return redirect("account:wishlist_detail")
+
+
 @login_required(login_url="account:login")
 def shipping(request):
     """Display Shipping formulary."""
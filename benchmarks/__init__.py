@@ -0,0 +1,52 @@
+"""Standalone benchmarks, each run against a throwaway test database.
+
+Run one from the project root with ``python -m benchmarks.<name>``.
+"""
+
+import atexit
+import os
+import statistics
+import time
+
+
+def setup():
+    """Configure Django and create an empty test database to benchmark on."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings.development")
+    os.environ.setdefault("DJANGO_SECRET_KEY", "benchmark")
+
+    import django
+
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    database_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    atexit.register(connection.creation.destroy_test_db, database_name, verbosity=0)
+
+
+def measure(func, repeat=20, before=None):
+    """Call func repeat times and return the median duration in milliseconds.
+
+    before, when given, is called untimed ahead of every call to func.
+    """
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def report(title, headers, rows):
+    """Print rows as an aligned plain text table."""
+    widths = [
+        max(len(str(value)) for value in column) for column in zip(headers, *rows)
+    ]
+    print(f"\n{title}")
+    for row in [headers, *rows]:
+        print("  ".join(str(value).rjust(width) for value, width in zip(row, widths)))
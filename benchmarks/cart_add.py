@@ -0,0 +1,64 @@
+"""Add-to-cart latency of the anonymous cookie cart against the database cart."""
+
+from . import measure, report, setup
+
+
+def main():
+    setup()
+
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from account.models import Account
+    from cart.models import Cart
+    from cart.session import SessionCart
+    from shop.models import Collection, Product
+
+    collection = Collection.objects.create(name="Bench")
+    product = Product.objects.create(
+        name="Piece",
+        price_in_cents=1500,
+        quantity=10,
+        image="products/bench.jpg",
+        collection=collection,
+    )
+    account = Account.objects.create_user(username="bench", email="b@example.com")
+    url = reverse("cart:add_to_cart", args=[product.id])
+
+    anonymous = Client()
+    logged_in = Client()
+    logged_in.force_login(account)
+    cart = Cart.objects.create(account=account)
+    session_cart = SessionCart()
+
+    def writes(client):
+        with CaptureQueriesContext(connection) as queries:
+            client.post(url)
+        return sum(
+            not query["sql"].startswith("SELECT") for query in queries.captured_queries
+        )
+
+    rows = [
+        (
+            "cookie (anonymous)",
+            writes(anonymous),
+            f"{measure(lambda: session_cart.add(product)):.3f}",
+            f"{measure(lambda: anonymous.post(url), repeat=50):.2f}",
+        ),
+        (
+            "database (logged in)",
+            writes(logged_in),
+            f"{measure(lambda: cart.add(product)):.3f}",
+            f"{measure(lambda: logged_in.post(url), repeat=50):.2f}",
+        ),
+    ]
+    report(
+        "Add to cart (median ms)",
+        ["backend", "writes per add", "cart.add", "POST add_to_cart"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Latency and query count of Order.create_from_cart as the cart grows."""
+
+import itertools
+import time
+from unittest.mock import patch
+from . import measure, report, setup
+
+SIZES = [1, 10, 30, 100]
+
+
+class StubSession:
+    ids = itertools.count()
+
+    def __init__(self, **kwargs):
+        self.id = f"cs_bench_{next(self.ids)}"
+        self.url = f"https://checkout.stripe.test/{self.id}"
+        self.expires_at = int(time.time()) + 24 * 60 * 60
+
+
+def main():
+    setup()
+
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from account.models import Account
+    from cart.models import Cart, Order
+    from shop.models import Collection, Product
+
+    collection = Collection.objects.create(name="Bench")
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Piece {i}",
+            price_in_cents=1500,
+            image="products/bench.jpg",
+            collection=collection,
+        )
+        for i in range(max(SIZES))
+    )
+    account = Account.objects.create_user(username="bench", email="b@example.com")
+    cart = Cart.objects.create(account=account)
+    request = RequestFactory().post("/")
+    request.user = account
+
+    rows = []
+    with patch("stripe.checkout.Session.create", StubSession):
+        for size in SIZES:
+            cart.clear()
+            for product in products[:size]:
+                cart.add(product, quantity=2)
+
+            def checkout():
+                Order.create_from_cart(request, cart, account)
+
+            def abandon_pending():
+                Order.objects.filter(status=Order.STATUS_PENDING).update(
+                    status=Order.STATUS_CANCELLED
+                )
+
+            abandon_pending()
+            with CaptureQueriesContext(connection) as queries:
+                checkout()
+            rows.append(
+                (
+                    size,
+                    len(queries),
+                    f"{measure(checkout, before=abandon_pending):.2f}",
+                    f"{measure(checkout):.2f}",
+                )
+            )
+
+    report(
+        "Order.create_from_cart with a stubbed Stripe session (median ms)",
+        ["cart lines", "queries", "new session", "reused session"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Latency of the first and last page of a collection as it grows."""
+
+from datetime import timedelta
+from . import measure, report, setup
+
+SIZES = [100, 1_000, 10_000, 100_000]
+
+
+def main():
+    setup()
+
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+    from django.utils import timezone
+    from shop.models import Collection, Product
+    from shop.pagination import encode_cursor
+
+    client = Client()
+    page_size = settings.SHOP_PAGE_SIZE
+    now = timezone.now()
+    rows = []
+    for size in SIZES:
+        collection = Collection.objects.create(
+            name=f"{size} products", image="collections/bench.jpg"
+        )
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"Piece {i}",
+                    description="Hand-thrown stoneware.",
+                    created_date=now - timedelta(minutes=i),
+                    collection=collection,
+                )
+                for i in range(size)
+            ),
+            batch_size=2_000,
+        )
+        url = reverse("shop:collection", args=[collection.id])
+        last = (
+            collection.product_set.order_by("-created_date", "-pk")
+            .only("created_date")[size - page_size - 1 : size - page_size]
+            .get()
+        )
+        last_page = {"after": encode_cursor(last.created_date, last.pk)}
+
+        client.get(url)
+        rows.append(
+            (
+                size,
+                f"{measure(lambda: client.get(url)):.2f}",
+                f"{measure(lambda: client.get(url, last_page)):.2f}",
+            )
+        )
+
+    report(
+        f"Collection page latency (median ms, {page_size} per page)",
+        ["products", "first page", "last page"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Bytes and server time per cart and wishlist interaction, full page against fragments."""
+
+from . import measure, report, setup
+
+
+def main():
+    setup()
+
+    from django.test import Client
+    from django.urls import reverse
+    from account.models import Account, Wishlist
+    from cart.models import Cart
+    from shop.models import Collection, Product
+
+    collection = Collection.objects.create(name="Bench")
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Piece {i}",
+            price_in_cents=1500,
+            quantity=10_000,
+            image="products/bench.jpg",
+            collection=collection,
+        )
+        for i in range(10)
+    )
+    account = Account.objects.create_user(username="bench", email="b@example.com")
+    wishlist = Wishlist.objects.create(account=account)
+    cart = Cart.objects.create(account=account)
+    for product in products:
+        cart.add(product)
+    product = products[0]
+    client = Client()
+    client.force_login(account)
+
+    interactions = [
+        ("add", reverse("cart:add_to_cart", args=[product.id]), None),
+        ("update", reverse("cart:update_cart", args=[product.id]), None),
+        (
+            "remove",
+            reverse("cart:remove_from_cart", args=[product.id]),
+            lambda: cart.add(product),
+        ),
+        ("wishlist add", reverse("account:add_to_wishlist", args=[product.id]), None),
+        (
+            "transfer",
+            reverse("account:transfer_to_cart", args=[product.id]),
+            lambda: wishlist.add(product),
+        ),
+    ]
+    variants = [
+        ("full page", {}),
+        ("htmx", {"HX-Request": "true"}),
+        ("json", {"Accept": "application/json"}),
+    ]
+
+    rows = []
+    for name, url, before in interactions:
+        for variant, headers in variants:
+
+            def interact():
+                response = client.post(
+                    url, {"quantity": 1}, headers=headers, follow=not headers
+                )
+                return len(response.content)
+
+            if before:
+                before()
+            size = interact()
+            ms = measure(interact, before=before)
+            rows.append((name, variant, size, f"{ms:.2f}"))
+
+    report(
+        "Bytes in the final response and median server ms per interaction",
+        ["interaction", "response", "bytes", "ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
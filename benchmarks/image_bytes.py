@@ -0,0 +1,175 @@
+"""Image bytes per shop and collection page, originals against responsive derivatives.
+
+For each <picture> the benchmark picks the candidate a browser would: the
+first source type it supports, then the narrowest srcset width covering
+the slot that sizes gives for the viewport and pixel density.
+"""
+
+import io
+import os
+import re
+import tempfile
+import time
+from html.parser import HTMLParser
+
+from . import report, setup
+
+PRODUCTS = 12
+VIEWPORTS = [("phone 390@2x", 390, 2), ("laptop 1440@1x", 1440, 1)]
+BROWSERS = [
+    ("avif", ["image/avif", "image/webp"]),
+    ("webp", ["image/webp"]),
+    ("jpeg", []),
+]
+
+
+class Pictures(HTMLParser):
+    """Collect every <img> of a page with the <source>s of its <picture>."""
+
+    def __init__(self):
+        super().__init__()
+        self.images = []
+        self.sources = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "picture":
+            self.sources = []
+        elif tag == "source":
+            self.sources.append(attrs)
+        elif tag == "img":
+            self.images.append((self.sources, attrs))
+            self.sources = []
+
+
+def slot_width(sizes, viewport):
+    """Evaluate a sizes attribute of (min-width: Npx) conditions in CSS px."""
+    for entry in sizes.split(","):
+        match = re.fullmatch(
+            r"\s*(?:\(min-width:\s*(\d+)px\)\s*)?(\d+)(px|vw)\s*", entry
+        )
+        min_width, length, unit = match.groups()
+        if min_width is None or viewport >= int(min_width):
+            return int(length) if unit == "px" else viewport * int(length) / 100
+    return viewport
+
+
+def pick(srcset, needed):
+    """Return the srcset URL a browser downloads for a slot of needed pixels."""
+    candidates = sorted(
+        (int(width.rstrip("w")), url)
+        for url, width in (c.split() for c in srcset.split(","))
+    )
+    covering = (url for width, url in candidates if width >= needed)
+    return next(covering, candidates[-1][1])
+
+
+def page_bytes(html, media_root, viewport, dpr, accepts):
+    """Sum the bytes of the images a browser would download for html."""
+    parser = Pictures()
+    parser.feed(html)
+    total = 0
+    for sources, img in parser.images:
+        if not img.get("src", "").startswith("/media/"):
+            continue
+        url = img["src"]
+        chosen = next((s for s in sources if s["type"] in accepts), None)
+        srcset = chosen["srcset"] if chosen else img.get("srcset")
+        if srcset:
+            sizes = (chosen or img)["sizes"]
+            url = pick(srcset, slot_width(sizes, viewport) * dpr)
+        total += os.path.getsize(os.path.join(media_root, url[len("/media/") :]))
+    return total
+
+
+def photo(width=3000, height=2250):
+    """Return a detailed photo-like JPEG, about as heavy as a camera original.
+
+    A fractal keeps detail at every scale, so the smaller derivatives do
+    not compress unrealistically well the way pure noise would.
+    """
+    from PIL import Image, ImageOps
+
+    x, y = -0.743644786, 0.1318252536
+    fractal = Image.effect_mandelbrot(
+        (width, height), (x - 3e-4, y - 2.25e-4, x + 3e-4, y + 2.25e-4), 400
+    )
+    image = ImageOps.colorize(fractal, "#3b2314", "#f3d9b1")
+    noise = Image.effect_noise((width, height), 24).convert("RGB")
+    image = Image.blend(image, noise, 0.12)
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def main():
+    setup()
+
+    from django.core.cache import cache
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from shop.models import Collection, Product
+
+    media_root = tempfile.mkdtemp()
+    override_settings(MEDIA_ROOT=media_root).enable()
+    original = default_storage.save("products/original.jpg", ContentFile(photo()))
+    collections = Collection.objects.bulk_create(
+        Collection(name=f"Bench {i}", image=original) for i in range(3)
+    )
+    Product.objects.bulk_create(
+        Product(name=f"Piece {i}", image=original, collection=collections[0])
+        for i in range(PRODUCTS)
+    )
+
+    start = time.perf_counter()
+    call_command("build_image_derivatives", stdout=io.StringIO())
+    backfill = time.perf_counter() - start
+    derivatives = {
+        (type(obj), obj.pk): obj.image_derivatives
+        for obj in [*Collection.objects.all(), *Product.objects.all()]
+    }
+
+    pages = [
+        ("shop", reverse("shop:shop")),
+        ("collection", reverse("shop:collection", args=[collections[0].pk])),
+    ]
+    client = Client()
+
+    def render(url):
+        cache.clear()
+        return client.get(url).content.decode()
+
+    Collection.objects.update(image_derivatives={})
+    Product.objects.update(image_derivatives={})
+    originals = {name: render(url) for name, url in pages}
+    for model in (Collection, Product):
+        for obj in model.objects.all():
+            model.objects.filter(pk=obj.pk).update(
+                image_derivatives=derivatives[model, obj.pk]
+            )
+    responsive = {name: render(url) for name, url in pages}
+
+    rows = []
+    for name, _ in pages:
+        for viewport_name, viewport, dpr in VIEWPORTS:
+            before = page_bytes(originals[name], media_root, viewport, dpr, [])
+            row = [name, viewport_name, f"{before:,}"]
+            for _, accepts in BROWSERS:
+                after = page_bytes(responsive[name], media_root, viewport, dpr, accepts)
+                row.append(f"{after:,}")
+            rows.append(row)
+    size = default_storage.size(original)
+    report(
+        f"Image bytes per page, {PRODUCTS} products, {size:,} byte originals",
+        ["page", "viewport", "original", *(fmt for fmt, _ in BROWSERS)],
+        rows,
+    )
+    print(f"\nBackfill of {len(derivatives)} images: {backfill:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Latency of the admin sales dashboard against live aggregation as orders grow."""
+
+import datetime
+import random
+from . import measure, report, setup
+
+SIZES = [1_000, 10_000, 100_000]
+PRODUCTS = 50
+DAYS = 365
+
+
+def main():
+    setup()
+
+    from django.db.models import F, Sum
+    from django.test import Client
+    from django.urls import reverse
+    from django.utils import timezone
+    from account.models import Account
+    from cart.models import Order, OrderItem
+    from cart.rollups import refresh_sales_rollups
+    from shop.models import Collection, Product
+
+    random.seed(0)
+    collections = Collection.objects.bulk_create(
+        Collection(name=f"Collection {i}") for i in range(5)
+    )
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Piece {i}",
+            price_in_cents=1500,
+            image="products/bench.jpg",
+            collection=collections[i % len(collections)],
+        )
+        for i in range(PRODUCTS)
+    )
+    account = Account.objects.create_user(username="bench", email="b@example.com")
+    admin_user = Account.objects.create_superuser(
+        username="admin", email="a@example.com", password="bench"
+    )
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("admin:cart_dailyproductsales_changelist")
+    now = timezone.now()
+
+    rows = []
+    created = 0
+    for size in SIZES:
+        orders = Order.objects.bulk_create(
+            Order(
+                account=account,
+                total_cents=3000,
+                status=Order.STATUS_PAID,
+                paid_at=now - datetime.timedelta(minutes=random.randrange(DAYS * 1440)),
+            )
+            for _ in range(size - created)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product=random.choice(products),
+                quantity=2,
+                unit_price_cents=1500,
+            )
+            for order in orders
+        )
+        created = size
+        refresh_sales_rollups(now=now + datetime.timedelta(minutes=5))
+
+        def live():
+            since = now - datetime.timedelta(days=30)
+            items = OrderItem.objects.filter(
+                order__status=Order.STATUS_PAID, order__paid_at__gte=since
+            )
+            totals = {
+                "units": Sum("quantity"),
+                "gross": Sum(F("quantity") * F("unit_price_cents")),
+            }
+            list(items.values("product__name").annotate(**totals))
+            list(items.values("product__collection__name").annotate(**totals))
+
+        def dashboard():
+            client.get(url, {"days": 30})
+
+        rows.append(
+            (
+                size,
+                f"{measure(live, repeat=10):.2f}",
+                f"{measure(dashboard, repeat=10):.2f}",
+            )
+        )
+
+    report(
+        "30 day sales totals (median ms)",
+        ["orders", "live aggregate", "dashboard"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
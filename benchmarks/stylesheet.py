@@ -0,0 +1,54 @@
+"""Size and build time of the compiled Tailwind stylesheet.
+
+Needs the tailwindcss command line from the project dependencies. The
+Play CDN script the pages loaded before is downloaded for comparison;
+pass the path of a saved copy instead on a machine without internet.
+"""
+
+import gzip
+import subprocess
+import sys
+import urllib.request
+from pathlib import Path
+
+from . import measure, report
+
+INPUT = Path("static_src/tailwind.css")
+OUTPUT = Path("static/css/site.css")
+PLAY_CDN = "https://cdn.tailwindcss.com"
+
+
+def build(minify=True):
+    command = ["tailwindcss", "--input", str(INPUT), "--output", str(OUTPUT)]
+    if minify:
+        command.append("--minify")
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def play_cdn_script():
+    """Return the Play CDN script, from the path given or downloaded."""
+    if len(sys.argv) > 1:
+        return Path(sys.argv[1]).read_bytes()
+    with urllib.request.urlopen(PLAY_CDN, timeout=30) as response:
+        return response.read()
+
+
+def sizes(payload):
+    return f"{len(payload):,}", f"{len(gzip.compress(payload, compresslevel=9)):,}"
+
+
+def main():
+    # Compiled in the browser on every page view, so there is no build step.
+    rows = [("Play CDN script", "-", *sizes(play_cdn_script()))]
+    for name, minify in [("unminified", False), ("minified", True)]:
+        ms = measure(lambda: build(minify), repeat=5)
+        rows.append((name, f"{ms:.0f}", *sizes(OUTPUT.read_bytes())))
+    report(
+        "Play CDN script against the compiled stylesheet",
+        ["build", "ms", "bytes", "gzip bytes"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
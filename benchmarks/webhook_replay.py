@@ -0,0 +1,98 @@
+"""Replay 10k recorded Stripe events, 30% of them duplicates, through the webhook."""
+
+import json
+import os
+import random
+import statistics
+import time
+from unittest.mock import patch
+from . import report, setup
+
+EVENTS = 10_000
+DUPLICATE_RATIO = 0.3
+
+
+def main():
+    setup()
+
+    from django.test import Client
+    from django.urls import reverse
+    from account.models import Account
+    from cart.inbox import process_batch
+    from cart.models import Order, WebhookEvent
+    from cart.webhooks import handle_event
+
+    account = Account.objects.create_user(username="bench", email="b@example.com")
+    unique = int(EVENTS * (1 - DUPLICATE_RATIO))
+    orders = Order.objects.bulk_create(
+        Order(account=account, total_cents=1500) for _ in range(unique)
+    )
+    recorded = [
+        {
+            "id": f"evt_{order.id}",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "client_reference_id": str(order.id),
+                    "payment_intent": f"pi_{order.id}",
+                }
+            },
+        }
+        for order in orders
+    ]
+    random.seed(0)
+    stream = recorded + random.choices(recorded, k=EVENTS - unique)
+    random.shuffle(stream)
+
+    client = Client()
+    url = reverse("cart:stripe_webhook")
+    os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+    seen = set()
+    timings = {"first delivery": [], "duplicate": []}
+    start = time.perf_counter()
+    with patch("stripe.Webhook.construct_event"):
+        for event in stream:
+            body = json.dumps(event)
+            began = time.perf_counter()
+            client.post(
+                url,
+                data=body,
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="t=1,v1=bench",
+            )
+            kind = "duplicate" if event["id"] in seen else "first delivery"
+            timings[kind].append((time.perf_counter() - began) * 1000)
+            seen.add(event["id"])
+    elapsed = time.perf_counter() - start
+
+    fulfilled = 0
+    real_fulfill = Order.fulfill
+
+    def counting_fulfill(self, *args, **kwargs):
+        nonlocal fulfilled
+        fulfilled += 1
+        return real_fulfill(self, *args, **kwargs)
+
+    with patch.object(Order, "fulfill", counting_fulfill):
+        while process_batch(handle_event, 200):
+            pass
+
+    report(
+        f"Webhook replay of {EVENTS} events ({len(timings['duplicate'])} duplicates)",
+        ["delivery", "requests", "median ms", "p99 ms"],
+        [
+            (
+                kind,
+                len(values),
+                f"{statistics.median(values):.2f}",
+                f"{statistics.quantiles(values, n=100)[98]:.2f}",
+            )
+            for kind, values in timings.items()
+        ],
+    )
+    print(f"\nEndpoint throughput: {EVENTS / elapsed:.0f} requests/s")
+    print(f"Inbox rows: {WebhookEvent.objects.count()}, fulfillments: {fulfilled}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Webhook acknowledgement latency and worker throughput in events/second."""
+
+import json
+import os
+import time
+from unittest.mock import patch
+from . import measure, report, setup
+
+EVENTS = 2_000
+BATCH_SIZES = [10, 50, 200]
+
+
+def main():
+    setup()
+
+    from django.test import Client
+    from django.urls import reverse
+    from account.models import Account
+    from cart.inbox import enqueue, process_batch
+    from cart.models import Order, WebhookEvent
+    from cart.webhooks import handle_event
+
+    account = Account.objects.create_user(
+        username="bench",
+        email="b@example.com",
+        billing_address_line1="1 Clay St",
+        shipping_address_line1="1 Clay St",
+    )
+
+    def completed(order_id, n):
+        return {
+            "id": f"evt_{n}",
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "client_reference_id": str(order_id),
+                    "payment_intent": f"pi_{n}",
+                }
+            },
+        }
+
+    client = Client()
+    url = reverse("cart:stripe_webhook")
+    counter = iter(range(10**9))
+    os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_bench")
+    with patch("stripe.Webhook.construct_event"):
+        ack = measure(
+            lambda: client.post(
+                url,
+                data=json.dumps(completed(0, f"ack_{next(counter)}")),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="t=1,v1=bench",
+            ),
+            repeat=200,
+        )
+    WebhookEvent.objects.all().delete()
+
+    rows = []
+    n = 0
+    for batch_size in BATCH_SIZES:
+        orders = Order.objects.bulk_create(
+            Order(account=account, total_cents=1500) for _ in range(EVENTS)
+        )
+        for order in orders:
+            n += 1
+            enqueue(completed(order.id, n))
+
+        start = time.perf_counter()
+        while process_batch(handle_event, batch_size):
+            pass
+        elapsed = time.perf_counter() - start
+        rows.append((batch_size, EVENTS, f"{EVENTS / elapsed:.0f}"))
+
+    print(f"\nWebhook acknowledgement latency: {ack:.2f} ms (median)")
+    report(
+        "process_webhooks throughput, one worker on SQLite",
+        ["batch size", "events", "events/s"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
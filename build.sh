@@ -1,4 +1,5 @@
 set -o errexit
 uv sync --frozen
+uv run tailwindcss --input static_src/tailwind.css --output static/css/site.css --minify
 uv run manage.py collectstatic --no-input
 uv run manage.py migrate --no-input
\ No newline at end of file
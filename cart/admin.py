@@ -1,7 +1,144 @@
+import datetime
 from django.contrib import admin
-from .models import Order, OrderItem, Cart, CartItem
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from .models import (
+    Order,
+    OrderItem,
+    Cart,
+    CartItem,
+    WebhookEvent,
+    DailyProductSales,
+    DailyCollectionSales,
+)
+from .exports import FORMATS, stream_orders
+from shop.admin import LargeTableAdmin
 
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Cart)
-admin.site.register(CartItem)
+MAX_DASHBOARD_DAYS = 3650
+
+
+def _export_action(fmt):
+    def export(modeladmin, request, queryset):
+        response = StreamingHttpResponse(
+            stream_orders(fmt, queryset), content_type=FORMATS[fmt]
+        )
+        stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+        response["Content-Disposition"] = f'attachment; filename="orders-{stamp}.{fmt}"'
+        return response
+
+    export.__name__ = f"export_{fmt}"
+    export.short_description = f"Export selected orders as {fmt.upper()}"
+    return export
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ["product"]
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ["__str__", "status", "total_cents", "created_at", "paid_at"]
+    list_select_related = ["account"]
+    list_filter = ["status", "created_at"]
+    search_fields = [
+        "payment_id__exact",
+        "account__username__exact",
+        "account__email__exact",
+    ]
+    raw_id_fields = ["account"]
+    inlines = [OrderItemInline]
+    actions = [_export_action("csv"), _export_action("jsonl")]
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ["__str__", "order", "unit_price_cents"]
+    list_select_related = ["product", "order__account"]
+    search_fields = ["order__payment_id__exact"]
+    raw_id_fields = ["order", "product"]
+
+
+@admin.register(Cart)
+class CartAdmin(LargeTableAdmin):
+    list_select_related = ["account"]
+    search_fields = ["account__username__exact", "account__email__exact"]
+    raw_id_fields = ["account"]
+
+
+@admin.register(CartItem)
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ["__str__", "cart"]
+    list_select_related = ["product", "cart__account"]
+    search_fields = ["cart__account__username__exact"]
+    raw_id_fields = ["cart", "product"]
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(LargeTableAdmin):
+    list_display = ["event_id", "event_type", "status", "attempts", "created_at"]
+    list_filter = ["status"]
+    search_fields = ["event_id__exact"]
+
+
+def _with_dollars(rows):
+    for row in rows:
+        row["gross"] = f"${row['gross_cents'] / 100:,.2f}"
+    return rows
+
+
+@admin.register(DailyProductSales)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Sales dashboard built only from the daily rollup tables."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = int(request.GET.get("days", 30))
+        except ValueError:
+            days = 30
+        days = min(max(1, days), MAX_DASHBOARD_DAYS)
+        start = timezone.localdate() - datetime.timedelta(days=days - 1)
+        products = DailyProductSales.objects.filter(day__gte=start)
+        collections = DailyCollectionSales.objects.filter(day__gte=start)
+        totals = {"units": Sum("units"), "gross_cents": Sum("gross_cents")}
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Sales dashboard",
+            "opts": self.model._meta,
+            "days": days,
+            "daily": _with_dollars(
+                list(products.values("day").annotate(**totals).order_by("-day"))
+            ),
+            "top_products": _with_dollars(
+                list(
+                    products.values("product__name")
+                    .annotate(**totals)
+                    .order_by("-gross_cents")[:10]
+                )
+            ),
+            "collections": _with_dollars(
+                list(
+                    collections.values("collection__name")
+                    .annotate(**totals, orders=Sum("order_count"))
+                    .order_by("-gross_cents")
+                )
+            ),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, "admin/cart/sales_dashboard.html", context)
@@ -1,7 +1,10 @@
-from .models import Cart
+from .counter import cart_count
+from .helpers import get_cart
 
 
 def cart_info(request):
-    cart = Cart(request)
-    count = cart.count()
-    return {"cart_count": count}
+    """Get the total count of units inside the account Cart."""
+    user = request.user
+    if not user.is_authenticated:
+        return {"cart_count": get_cart(request).count()}
+    return {"cart_count": cart_count.get(user.pk)}
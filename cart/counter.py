@@ -0,0 +1,16 @@
+from django.db.models import Sum
+from shop.counter import KeyedCounter
+
+
+def _count_cart_units(account_id):
+    from .models import CartItem
+
+    return (
+        CartItem.objects.filter(cart__account_id=account_id).aggregate(
+            total=Sum("quantity")
+        )["total"]
+        or 0
+    )
+
+
+cart_count = KeyedCounter("cart:count", _count_cart_units)
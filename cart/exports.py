@@ -0,0 +1,82 @@
+import csv
+import datetime
+import json
+from django.utils import timezone
+from .models import OrderItem
+
+# One row per order line, with the order columns repeated on each line.
+EXPORT_FIELDS = {
+    "order_id": "order_id",
+    "created_at": "order__created_at",
+    "paid_at": "order__paid_at",
+    "status": "order__status",
+    "payment_id": "order__payment_id",
+    "email": "order__account__email",
+    "total_cents": "order__total_cents",
+    "shipping_country": "order__shipping_country",
+    "product_id": "product_id",
+    "product_name": "product__name",
+    "quantity": "quantity",
+    "unit_price_cents": "unit_price_cents",
+}
+CHUNK_SIZE = 2000
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def filter_by_date(orders, since=None, until=None):
+    """Limit orders to those created on or between the since and until dates."""
+    tz = timezone.get_current_timezone()
+    if since:
+        start = datetime.datetime.combine(since, datetime.time.min, tzinfo=tz)
+        orders = orders.filter(created_at__gte=start)
+    if until:
+        end = datetime.datetime.combine(
+            until + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz
+        )
+        orders = orders.filter(created_at__lt=end)
+    return orders
+
+
+def export_rows(orders=None, chunk_size=CHUNK_SIZE):
+    """Yield a dict per order line of the given orders, ordered by order id.
+
+    Rows are read through a server-side cursor, chunk_size at a time, so
+    memory stays flat however many orders are exported.
+    """
+    items = OrderItem.objects.all()
+    if orders is not None:
+        items = items.filter(order__in=orders.values("pk"))
+    rows = (
+        items.order_by("order_id", "pk")
+        .values_list(*EXPORT_FIELDS.values())
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+class _Echo:
+    """File-like object that returns what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=list(EXPORT_FIELDS))
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def stream_orders(fmt, orders=None, chunk_size=CHUNK_SIZE):
+    """Return an iterator of CSV or JSONL chunks for the given orders."""
+    rows = export_rows(orders, chunk_size=chunk_size)
+    if fmt == "csv":
+        return stream_csv(rows)
+    return stream_jsonl(rows)
@@ -0,0 +1,57 @@
+from django.http import HttpResponse, JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from .helpers import get_cart_summary
+
+
+def wants_json(request):
+    """True when the client prefers JSON over HTML."""
+    return (
+        request.get_preferred_type(["text/html", "application/json"])
+        == "application/json"
+    )
+
+
+def wants_fragment(request):
+    """True for htmx requests and JSON clients, which only need what changed."""
+    return request.headers.get("HX-Request") == "true" or wants_json(request)
+
+
+def fragment_response(request, template, context, data):
+    """Respond with data as JSON, or with template rendered on its own.
+
+    The partial is rendered without context processors, so none of the
+    queries behind the nav and the rest of the page run.
+    """
+    if wants_json(request):
+        return JsonResponse(data)
+    context = {**context, "csrf_token": get_token(request)}
+    return HttpResponse(render_to_string(template, context))
+
+
+def cart_fragment(request, product, message, template="cart/partials/cart_update.html"):
+    """Respond with the changed cart line, the cart totals and the badge count.
+
+    The default template is for the cart page, where the line is swapped
+    into the table. Other pages pass a template with only what they show.
+    """
+    summary = get_cart_summary(request)
+    item = next((item for item in summary.items if item.product_id == product.pk), None)
+    return fragment_response(
+        request,
+        template,
+        {
+            "item": item,
+            "message": message,
+            "subtotal_dollars": summary.subtotal_dollars,
+            "cart_count": summary.quantity,
+        },
+        {
+            "message": str(message),
+            "product_id": product.pk,
+            "quantity": item.quantity if item else 0,
+            "line_cents": item.total_cents if item else 0,
+            "subtotal_cents": summary.subtotal_cents,
+            "cart_count": summary.quantity,
+        },
+    )
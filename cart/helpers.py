@@ -1,6 +1,5 @@
 from .models import Cart
-from django.core.exceptions import ImproperlyConfigured
-from django.utils.translation import gettext_lazy as _
+from .session import SessionCart
 
 
 def parse_quantity(request):
@@ -12,11 +11,51 @@ def parse_quantity(request):
     return max(1, qty)
 
 
+def parse_quantities(request):
+    """Helper function to read the quantity-<product_id> fields of a form."""
+    quantities = {}
+    for key, value in request.POST.items():
+        prefix, _, product_id = key.partition("-")
+        if prefix != "quantity":
+            continue
+        try:
+            quantities[int(product_id)] = max(0, int(value))
+        except ValueError:
+            continue
+    return quantities
+
+
 def get_cart(request):
-    """Helper function to get or create cart for the authenticated account."""
+    """Helper function to get the cart of the account or anonymous visitor.
+
+    Authenticated accounts get their persistent Cart, which is only created
+    on its first write. Anonymous visitors get a SessionCart loaded from
+    their cart cookie. Either is looked up once per request and is what
+    CartMiddleware exposes as request.cart.
+    """
     user = request.user
     if not user.is_authenticated:
-        raise ImproperlyConfigured(_("get_cart() called without an authenticated user"))
+        if not hasattr(request, "_session_cart"):
+            request._session_cart = SessionCart.from_request(request)
+        return request._session_cart
+
+    if not hasattr(request, "_cart"):
+        request._cart = Cart.for_account(user)
+    return request._cart
+
+
+def merge_session_cart(request):
+    """Move the anonymous cart of the request into the just logged in account."""
+    session_cart = SessionCart.from_request(request)
+    if not session_cart.quantities:
+        return
+    get_cart(request).merge(session_cart.quantities)
+    session_cart.clear()
+    request._session_cart = session_cart
+
 
-    cart, created = Cart.objects.get_or_create(account=user)
-    return cart
+def get_cart_summary(request):
+    """Helper function to get the cart summary, computed once per request."""
+    if not hasattr(request, "_cart_summary"):
+        request._cart_summary = get_cart(request).summary()
+    return request._cart_summary
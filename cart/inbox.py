@@ -0,0 +1,102 @@
+import datetime
+import traceback
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import WebhookEvent
+
+# How long a claimed event stays invisible to other workers.
+LEASE = datetime.timedelta(minutes=5)
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = datetime.timedelta(seconds=30)
+BACKOFF_MAX = datetime.timedelta(hours=1)
+# How long finished events are kept to recognize redeliveries.
+RETENTION = datetime.timedelta(days=30)
+
+
+def enqueue(event):
+    """Store a verified Stripe event in the inbox, returning False if known.
+
+    The inbox doubles as the ledger of received events: a redelivery costs
+    one read on the unique event_id index and never takes a write lock.
+    """
+    if WebhookEvent.objects.filter(event_id=event["id"]).exists():
+        return False
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event["id"], event_type=event["type"], payload=event)],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def prune(retention=RETENTION, batch_size=1000):
+    """Delete finished events older than retention, returning the count.
+
+    Rows are deleted in batches so the table is never locked for long.
+    Stripe stops redelivering an event after three days, and fulfilling an
+    already paid order is a no-op, so a redelivery past the window is safe.
+    """
+    cutoff = timezone.now() - retention
+    finished = WebhookEvent.objects.filter(
+        status__in=[WebhookEvent.STATUS_DONE, WebhookEvent.STATUS_DEAD],
+        created_at__lt=cutoff,
+    )
+    deleted = 0
+    while True:
+        ids = list(finished.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += WebhookEvent.objects.filter(pk__in=ids).delete()[0]
+
+
+def backoff(attempts):
+    """Delay before retrying an event that has failed attempts times."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim_batch(batch_size):
+    """Lease up to batch_size due events to the calling worker.
+
+    On PostgreSQL rows already locked by another worker are skipped, on
+    SQLite the IMMEDIATE transaction serializes claims. Either way a
+    leased event is hidden from other workers until the lease runs out,
+    so a crashed worker's batch is picked up again later.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            WebhookEvent.objects.filter(
+                status=WebhookEvent.STATUS_PENDING, available_at__lte=now
+            )
+            .order_by("available_at", "pk")
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        WebhookEvent.objects.filter(pk__in=ids).update(
+            available_at=now + LEASE, attempts=F("attempts") + 1
+        )
+    return list(WebhookEvent.objects.filter(pk__in=ids).order_by("pk"))
+
+
+def process_batch(handler, batch_size=50):
+    """Claim a batch and run handler on each event, returning the batch size.
+
+    Failed events are retried with exponential backoff and dead-lettered
+    once they reach MAX_ATTEMPTS.
+    """
+    events = claim_batch(batch_size)
+    for event in events:
+        try:
+            with transaction.atomic():
+                handler(event.payload)
+                WebhookEvent.objects.filter(pk=event.pk).update(
+                    status=WebhookEvent.STATUS_DONE, processed_at=timezone.now()
+                )
+        except Exception:
+            event.last_error = traceback.format_exc()
+            if event.attempts >= MAX_ATTEMPTS:
+                event.status = WebhookEvent.STATUS_DEAD
+            else:
+                event.available_at = timezone.now() + backoff(event.attempts)
+            event.save(update_fields=["status", "available_at", "last_error"])
+    return len(events)
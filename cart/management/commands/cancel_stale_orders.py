@@ -0,0 +1,46 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from cart.models import Order, StockReservation
+
+
+class Command(BaseCommand):
+    help = "Cancel pending orders abandoned in Stripe Checkout."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24,
+            help="Cancel pending orders created more than this many hours ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, hours, batch_size, **options):
+        start = time.perf_counter()
+        cutoff = timezone.now() - datetime.timedelta(hours=hours)
+        stale = Order.objects.filter(
+            status=Order.STATUS_PENDING, created_at__lt=cutoff
+        ).order_by("created_at")
+
+        total = 0
+        batch = 0
+        while True:
+            ids = list(stale.values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                cancelled = Order.objects.filter(
+                    pk__in=ids, status=Order.STATUS_PENDING
+                ).update(status=Order.STATUS_CANCELLED)
+                StockReservation.objects.filter(order__in=ids).delete()
+            batch += 1
+            total += cancelled
+            self.stdout.write(f"Batch {batch}: cancelled {cancelled} orders.")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Cancelled {total} orders in {elapsed:.2f}s.")
+        )
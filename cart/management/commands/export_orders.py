@@ -0,0 +1,34 @@
+import datetime
+from django.core.management.base import BaseCommand
+from cart.exports import FORMATS, filter_by_date, stream_orders
+from cart.models import Order
+
+
+class Command(BaseCommand):
+    help = "Stream orders and their lines as CSV or JSONL for accounting."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(FORMATS), default="csv")
+        parser.add_argument(
+            "--since",
+            type=datetime.date.fromisoformat,
+            help="First day to export, as YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--until",
+            type=datetime.date.fromisoformat,
+            help="Last day to export, as YYYY-MM-DD.",
+        )
+        parser.add_argument(
+            "--output", help="File to write to instead of standard output."
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, format, since, until, output, chunk_size, **options):
+        orders = filter_by_date(Order.objects.all(), since, until)
+        chunks = stream_orders(format, orders, chunk_size=chunk_size)
+        if output:
+            with open(output, "w", newline="") as out:
+                out.writelines(chunks)
+        else:
+            self.stdout.writelines(chunks)
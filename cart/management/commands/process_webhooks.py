@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from cart.inbox import process_batch
+from cart.webhooks import handle_event
+
+
+class Command(BaseCommand):
+    help = "Process Stripe events queued in the webhook inbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the inbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the inbox has no due events.",
+        )
+
+    def handle(self, *args, batch_size, sleep, once, **options):
+        processed = 0
+        try:
+            while True:
+                count = process_batch(handle_event, batch_size)
+                processed += count
+                if count:
+                    self.stdout.write(f"Processed {count} events.")
+                elif once:
+                    break
+                else:
+                    time.sleep(sleep)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} events in total."))
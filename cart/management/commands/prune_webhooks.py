@@ -0,0 +1,15 @@
+import datetime
+from django.core.management.base import BaseCommand
+from cart.inbox import RETENTION, prune
+
+
+class Command(BaseCommand):
+    help = "Delete processed Stripe events older than the retention window."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=RETENTION.days)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, days, batch_size, **options):
+        deleted = prune(datetime.timedelta(days=days), batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} events."))
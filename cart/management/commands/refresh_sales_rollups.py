@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from cart.rollups import refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Roll up orders paid or cancelled since the last refresh into daily sales."
+
+    def handle(self, *args, **options):
+        days = refresh_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {len(days)} days."))
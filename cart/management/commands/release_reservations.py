@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from cart.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = "Release stock held by expired checkout reservations."
+
+    def handle(self, *args, **options):
+        released, _ = StockReservation.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} reservations."))
@@ -0,0 +1,23 @@
+from functools import partial
+from django.utils.functional import SimpleLazyObject
+from .helpers import get_cart
+
+
+class CartMiddleware:
+    """Expose the cart as a lazy request.cart and persist anonymous carts.
+
+    The cart is looked up on first use and shared by every view, helper
+    and context processor of the request. An anonymous SessionCart changed
+    by the view is written back to its cookie on the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(partial(get_cart, request))
+        response = self.get_response(request)
+        cart = getattr(request, "_session_cart", None)
+        if cart is not None and cart.modified:
+            cart.save(response)
+        return response
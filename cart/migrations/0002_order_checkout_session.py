@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="cart_fingerprint",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, verbose_name="cart_fingerprint"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="checkout_expires_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="checkout_expires_at"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="checkout_session_id",
+            field=models.CharField(
+                blank=True,
+                max_length=255,
+                null=True,
+                verbose_name="checkout_session_id",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="checkout_url",
+            field=models.URLField(
+                blank=True, max_length=2048, null=True, verbose_name="checkout_url"
+            ),
+        ),
+    ]
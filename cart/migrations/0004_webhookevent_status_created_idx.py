@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0003_webhookevent"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                fields=["status", "created_at"], name="webhook_status_created_idx"
+            ),
+        ),
+    ]
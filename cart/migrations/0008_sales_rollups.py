@@ -0,0 +1,132 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_paid_at(apps, schema_editor):
+    Order = apps.get_model("cart", "Order")
+    Order.objects.filter(status="paid", paid_at__isnull=True).update(
+        paid_at=F("created_at")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0007_order_account_created_idx"),
+        ("shop", "0003_product_collection_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyCollectionSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="day")),
+                ("units", models.PositiveIntegerField(default=0, verbose_name="units")),
+                (
+                    "gross_cents",
+                    models.BigIntegerField(default=0, verbose_name="gross_cents"),
+                ),
+                (
+                    "order_count",
+                    models.PositiveIntegerField(default=0, verbose_name="order_count"),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily collection sales",
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="day")),
+                ("units", models.PositiveIntegerField(default=0, verbose_name="units")),
+                (
+                    "gross_cents",
+                    models.BigIntegerField(default=0, verbose_name="gross_cents"),
+                ),
+                (
+                    "order_count",
+                    models.PositiveIntegerField(default=0, verbose_name="order_count"),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily product sales",
+            },
+        ),
+        migrations.CreateModel(
+            name="SalesRollupState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "high_water_mark",
+                    models.DateTimeField(verbose_name="high_water_mark"),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="paid_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="paid_at"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["paid_at"], name="order_paid_at_idx"),
+        ),
+        migrations.AddField(
+            model_name="dailycollectionsales",
+            name="collection",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="shop.collection"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailyproductsales",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="shop.product"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailycollectionsales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "collection"), name="unique_collection_per_day"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailyproductsales",
+            constraint=models.UniqueConstraint(
+                fields=("day", "product"), name="unique_product_per_day"
+            ),
+        ),
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+    ]
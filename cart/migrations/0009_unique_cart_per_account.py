@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Fold every extra cart of an account into its oldest one."""
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+    duplicated = (
+        Cart.objects.values("account")
+        .annotate(carts=Count("pk"))
+        .filter(carts__gt=1)
+        .values_list("account", flat=True)
+    )
+    for account_id in duplicated:
+        keep, *extra = Cart.objects.filter(account=account_id).order_by("pk")
+        for item in CartItem.objects.filter(cart__in=extra):
+            kept = CartItem.objects.filter(cart=keep, product=item.product_id)
+            if kept.update(quantity=F("quantity") + item.quantity):
+                item.delete()
+            else:
+                item.cart = keep
+                item.save(update_fields=["cart"])
+        Cart.objects.filter(pk__in=[cart.pk for cart in extra]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0008_sales_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cart",
+            constraint=models.UniqueConstraint(
+                fields=["account"], name="unique_cart_per_account"
+            ),
+        ),
+    ]
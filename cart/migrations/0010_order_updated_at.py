@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0009_unique_cart_per_account"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="updated_at"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["updated_at"], name="order_updated_at_idx"),
+        ),
+    ]
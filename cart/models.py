@@ -1,10 +1,58 @@
-from shop.models import Product
-from account.models import Account
+from shop.models import Collection, Product
+from account.counter import wishlist_count
+from account.models import Account, Wishlist
+import datetime
+import hashlib
+import logging
 import stripe
-from django.db import models
+from functools import partial
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Sum
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
+from .counter import cart_count
+
+logger = logging.getLogger(__name__)
+
+# A reused Stripe Checkout Session must stay open at least this long.
+CHECKOUT_REUSE_MARGIN = datetime.timedelta(minutes=5)
+# How long stock is held for a checkout, Stripe's minimum session lifetime.
+RESERVATION_TTL = datetime.timedelta(minutes=30)
+# Stripe counts that minimum from when it receives the request, so the
+# expiry sent must clear it by a little.
+STRIPE_EXPIRY_MARGIN = datetime.timedelta(minutes=1)
+
+
+class OutOfStock(Exception):
+    """Raised when the stock of some products cannot cover a checkout."""
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(", ".join(product.name for product in products))
+
+
+def expire_checkout_session(session_id):
+    """Expire a Checkout Session in Stripe so it can no longer be paid.
+
+    A session Stripe refuses to expire, for instance because it was just
+    paid, is left for its webhook to settle.
+    """
+    try:
+        stripe.checkout.Session.expire(session_id)
+    except stripe.error.StripeError as exc:
+        logger.warning("Could not expire Checkout Session %s: %s", session_id, exc)
+
+
+def cart_fingerprint(cart_items):
+    """Return a digest of the product ids, quantities and unit prices of a cart."""
+    lines = sorted(
+        f"{item.product_id}:{item.quantity}:{item.product.price_in_cents}"
+        for item in cart_items
+    )
+    return hashlib.sha256("|".join(lines).encode()).hexdigest()
 
 
 class Order(models.Model):
@@ -31,6 +79,21 @@ class Order(models.Model):
         _("status"), max_length=20, choices=STATUS_CHOICES, default="pending"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(_("updated_at"), auto_now=True)
+    paid_at = models.DateTimeField(_("paid_at"), blank=True, null=True)
+
+    cart_fingerprint = models.CharField(
+        _("cart_fingerprint"), max_length=64, blank=True, null=True
+    )
+    checkout_session_id = models.CharField(
+        _("checkout_session_id"), max_length=255, blank=True, null=True
+    )
+    checkout_url = models.URLField(
+        _("checkout_url"), max_length=2048, blank=True, null=True
+    )
+    checkout_expires_at = models.DateTimeField(
+        _("checkout_expires_at"), blank=True, null=True
+    )
 
     billing_address_line1 = models.CharField(
         _("billing_address_line1"), max_length=255, blank=True, null=True
@@ -64,6 +127,24 @@ class Order(models.Model):
         _("shipping_country"), max_length=100, blank=True, null=True
     )
 
+    FULFILL_FIELDS = [
+        "payment_id",
+        "total_cents",
+        "status",
+        "paid_at",
+        "updated_at",
+        "billing_address_line1",
+        "billing_address_line2",
+        "billing_city",
+        "billing_postal_code",
+        "billing_country",
+        "shipping_address_line1",
+        "shipping_address_line2",
+        "shipping_city",
+        "shipping_postal_code",
+        "shipping_country",
+    ]
+
     def set_status(self, status: str) -> None:
         """Represents the status of an Order,"""
         current_status = status.lower()
@@ -74,7 +155,14 @@ class Order(models.Model):
         }:
             raise ValueError(f"Invalid status: {status}")
         self.status = current_status
-        self.save()
+        update_fields = ["status", "updated_at"]
+        if current_status == self.STATUS_PAID and not self.paid_at:
+            self.paid_at = timezone.now()
+            update_fields.append("paid_at")
+        with transaction.atomic():
+            self.save(update_fields=update_fields)
+            if current_status == self.STATUS_CANCELLED:
+                self.reservations.all().delete()
 
     def fulfill(
         self,
@@ -92,8 +180,14 @@ class Order(models.Model):
         shipping_city: str,
         shipping_postal_code: str,
         shipping_country: str,
-    ) -> None:
-        """Fulfill order with payment details."""
+    ) -> list:
+        """Fulfill order with payment details, mark it paid and take its stock.
+
+        The order is written once, its stock holds are converted and each
+        product's stock is decremented by a single conditional UPDATE, all in
+        one transaction. Returns the (product_id, quantity) lines that could
+        not be covered by stock.
+        """
         self.name = name
         self.email = email
         self.payment_id = payment_id
@@ -108,39 +202,81 @@ class Order(models.Model):
         self.shipping_city = shipping_city
         self.shipping_postal_code = shipping_postal_code
         self.shipping_country = shipping_country
-        self.save()
+        self.status = self.STATUS_PAID
+        self.paid_at = timezone.now()
+        with transaction.atomic():
+            self.save(update_fields=self.FULFILL_FIELDS)
+            self.reservations.all().delete()
+            return self.decrement_stock()
+
+    def decrement_stock(self) -> list:
+        """Take the ordered quantities from stock, returning oversold lines."""
+        lines = self.items.values_list("product_id").annotate(total=Sum("quantity"))
+        oversold = []
+        for product_id, quantity in lines:
+            updated = Product.objects.filter(
+                pk=product_id, quantity__gte=quantity
+            ).update(quantity=F("quantity") - quantity)
+            if not updated:
+                oversold.append((product_id, quantity))
+        if oversold:
+            logger.warning("Order %s oversold lines: %s", self.pk, oversold)
+        return oversold
 
     @classmethod
     def create_from_cart(cls, request, cart, account):
-        """Create Order + OrderItems from cart and return Stripe Checkout session."""
+        """Create Order + OrderItems from cart and return Stripe Checkout session.
+
+        The ordered stock is held until the session expires, raising
+        OutOfStock when another checkout already holds or bought it. Other
+        pending orders of the account are released first, so an abandoned
+        checkout never holds stock against the next one.
+        """
 
-        cart_items = list(cart.items())
+        cart_items = list(cart.items().select_related("product"))
         if not cart_items:
             return None, None
 
-        order = cls.objects.create(account=account, total_cents=cart.subtotal_cents())
-
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity,
-                unit_price_cents=item.unit_cents,
+        fingerprint = cart_fingerprint(cart_items)
+        reusable = (
+            cls.objects.filter(
+                account=account,
+                status=cls.STATUS_PENDING,
+                cart_fingerprint=fingerprint,
+                checkout_expires_at__gt=timezone.now() + CHECKOUT_REUSE_MARGIN,
             )
+            .order_by("-created_at")
+            .first()
+        )
+        if reusable:
+            checkout_session = stripe.checkout.Session.construct_from(
+                {"id": reusable.checkout_session_id, "url": reusable.checkout_url},
+                stripe.api_key,
+            )
+            return checkout_session, reusable
 
+        total_cents = 0
+        order_items = []
         line_items = []
         for item in cart_items:
+            product = item.product
+            total_cents += item.quantity * product.price_in_cents
+            order_items.append(
+                OrderItem(
+                    product=product,
+                    quantity=item.quantity,
+                    unit_price_cents=product.price_in_cents,
+                )
+            )
             line_items.append(
                 {
                     "price_data": {
-                        "unit_amount": item.unit_cents,
+                        "unit_amount": product.price_in_cents,
                         "currency": "cad",
                         "product_data": {
-                            "name": item.product.name,
-                            "images": [
-                                request.build_absolute_uri(item.product.image.url)
-                            ]
-                            if item.product.image
+                            "name": product.name,
+                            "images": [request.build_absolute_uri(product.image.url)]
+                            if product.image
                             else [],
                         },
                     },
@@ -148,20 +284,100 @@ class Order(models.Model):
                 }
             )
 
+        expires_at = timezone.now().replace(microsecond=0)
+        expires_at += RESERVATION_TTL + 2 * STRIPE_EXPIRY_MARGIN
+        with transaction.atomic():
+            cls.release_pending(account)
+            StockReservation.reserve(
+                {item.product: item.quantity for item in cart_items}
+            )
+            order = cls.objects.create(
+                account=account,
+                total_cents=total_cents,
+                cart_fingerprint=fingerprint,
+            )
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            StockReservation.objects.bulk_create(
+                StockReservation(
+                    order=order,
+                    product=item.product,
+                    quantity=item.quantity,
+                    expires_at=expires_at,
+                )
+                for item in cart_items
+            )
+
         session_args = {
             "client_reference_id": str(order.id),
             "line_items": line_items,
             "mode": "payment",
             "success_url": request.build_absolute_uri(reverse("cart:success"))
             + "?session_id={CHECKOUT_SESSION_ID}",
-            "cancel_url": request.build_absolute_uri(reverse("cart:cancel")),
+            "cancel_url": request.build_absolute_uri(reverse("cart:cancel"))
+            + f"?order={order.id}",
             "customer_email": account.email,
             "billing_address_collection": "auto",
         }
 
-        checkout_session = stripe.checkout.Session.create(**session_args)
+        earliest = timezone.now().replace(microsecond=0)
+        earliest += RESERVATION_TTL + STRIPE_EXPIRY_MARGIN
+        if expires_at < earliest:
+            # The reservation took long enough to eat the margin, keep the
+            # holds as long as the session stays open.
+            expires_at = earliest
+            order.reservations.update(expires_at=expires_at)
+        session_args["expires_at"] = int(expires_at.timestamp())
+
+        try:
+            checkout_session = stripe.checkout.Session.create(**session_args)
+        except stripe.error.StripeError:
+            order.delete()
+            raise
+
+        order.checkout_session_id = checkout_session.id
+        order.checkout_url = checkout_session.url
+        order.checkout_expires_at = datetime.datetime.fromtimestamp(
+            checkout_session.expires_at, tz=datetime.timezone.utc
+        )
+        order.save(
+            update_fields=["checkout_session_id", "checkout_url", "checkout_expires_at"]
+        )
         return checkout_session, order
 
+    @classmethod
+    def release_pending(cls, account, order_id=None):
+        """Cancel the pending orders of account and delete their stock holds.
+
+        Only order_id is released when given. Must run inside a transaction:
+        the open Checkout Sessions are expired in Stripe once it commits, so
+        no lock is held during the round trip and a rollback leaves both the
+        orders and their sessions open. Returns the ids of the cancelled
+        orders.
+        """
+        now = timezone.now()
+        pending = cls.objects.select_for_update().filter(
+            account=account, status=cls.STATUS_PENDING
+        )
+        if order_id is not None:
+            pending = pending.filter(pk=order_id)
+        orders = list(
+            pending.values_list("pk", "checkout_session_id", "checkout_expires_at")
+        )
+        if not orders:
+            return []
+
+        cancelled = [order[0] for order in orders]
+        cls.objects.filter(pk__in=cancelled).update(
+            status=cls.STATUS_CANCELLED, checkout_expires_at=now
+        )
+        StockReservation.objects.filter(order__in=cancelled).delete()
+        for pk, session_id, session_expires_at in orders:
+            if session_id and (session_expires_at is None or session_expires_at > now):
+                transaction.on_commit(partial(expire_checkout_session, session_id))
+        return cancelled
+
     @property
     def total_in_dollars(self):
         return self.total_cents // 100
@@ -169,6 +385,18 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.payment_id} - {self.account.email}"
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "created_at"], name="order_status_created_idx"
+            ),
+            models.Index(
+                fields=["account", "created_at"], name="order_account_created_idx"
+            ),
+            models.Index(fields=["paid_at"], name="order_paid_at_idx"),
+            models.Index(fields=["updated_at"], name="order_updated_at_idx"),
+        ]
+
 
 class OrderItem(models.Model):
     """Represents Individual items in an order."""
@@ -200,56 +428,282 @@ class Cart(models.Model):
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
     products = models.ManyToManyField(Product, through="CartItem")
 
+    @classmethod
+    def for_account(cls, account):
+        """Return the cart of account, unsaved until its first write if new."""
+        return cls.objects.filter(account=account).first() or cls(account=account)
+
+    def _ensure_saved(self):
+        """Create the cart row on the first write to a cart that was only read."""
+        if self.pk is None:
+            # Another request of the account may have created it first.
+            saved, created = Cart.objects.get_or_create(account=self.account)
+            self.pk = saved.pk
+            self._state.adding = False
+
     def items(self):
         """Returns all CartItem objects for this cart."""
+        if self.pk is None:
+            return CartItem.objects.none()
         return CartItem.objects.filter(cart=self)
 
     def add(self, product: Product, quantity=1, replace=False):
-        """Add a product to the cart or update its quantity."""
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=self, product=product, defaults={"quantity": quantity}
+        """Add a product to the cart or update its quantity.
+
+        Each change is a single atomic statement, so concurrent requests on
+        the same cart never lose an update.
+        """
+        self._ensure_saved()
+        if replace:
+            CartItem.objects.bulk_create(
+                [CartItem(cart=self, product=product, quantity=quantity)],
+                update_conflicts=True,
+                unique_fields=["cart", "product"],
+                update_fields=["quantity"],
+            )
+            cart_count.forget(self.account_id)
+            return
+
+        items = CartItem.objects.filter(cart=self, product=product)
+        if not items.update(quantity=F("quantity") + quantity):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(
+                        cart=self, product=product, quantity=quantity
+                    )
+            except IntegrityError:
+                # Another request inserted the line first, add on top of it.
+                items.update(quantity=F("quantity") + quantity)
+        cart_count.incr(self.account_id, quantity)
+
+    def set_quantities(self, quantities):
+        """Set the quantities of several cart lines at once.
+
+        quantities maps product ids to their new quantity, zero removing the
+        line. The lines and their stock are read in one query and the change
+        is applied with one bulk_update and one delete in a transaction.
+        Raises OutOfStock, changing nothing, if any quantity exceeds stock.
+        """
+        if self.pk is None:
+            return
+        with transaction.atomic():
+            items = list(
+                CartItem.objects.filter(cart=self, product__in=quantities)
+                .select_related("product")
+                .select_for_update(of=("self",))
+            )
+            short = [
+                item.product
+                for item in items
+                if quantities[item.product_id] > item.product.quantity
+            ]
+            if short:
+                raise OutOfStock(short)
+
+            changed = []
+            removed = []
+            for item in items:
+                quantity = quantities[item.product_id]
+                if quantity <= 0:
+                    removed.append(item.pk)
+                elif quantity != item.quantity:
+                    item.quantity = quantity
+                    changed.append(item)
+            if changed:
+                CartItem.objects.bulk_update(changed, ["quantity"])
+            if removed:
+                CartItem.objects.filter(pk__in=removed).delete()
+        cart_count.forget(self.account_id)
+
+    def merge(self, quantities):
+        """Add the {product_id: quantity} lines of another cart to this one.
+
+        Existing lines are read once and everything is written back in a
+        single bulk upsert. Products that no longer exist are skipped.
+        """
+        self._ensure_saved()
+        existing = dict(
+            CartItem.objects.filter(cart=self, product__in=quantities).values_list(
+                "product_id", "quantity"
+            )
+        )
+        product_ids = Product.objects.filter(pk__in=quantities).values_list(
+            "pk", flat=True
         )
-        if not created:
-            if replace:
-                cart_item.quantity = quantity
-            else:
-                cart_item.quantity += quantity
-            cart_item.save()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=self,
+                    product_id=pk,
+                    quantity=existing.get(pk, 0) + quantities[pk],
+                )
+                for pk in product_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["cart", "product"],
+            update_fields=["quantity"],
+        )
+        cart_count.forget(self.account_id)
+
+    def move_from_wishlist(self, wishlist, product_ids=None):
+        """Move products, all of them by default, from wishlist to this cart.
+
+        Runs in one transaction with one read of the wishlist lines, one
+        bulk insert into the cart and one delete of the moved lines, however
+        many products move. Products already in the cart keep their quantity.
+        Returns the ids of the moved products.
+        """
+        if wishlist.pk is None:
+            return []
+        lines = Wishlist.product.through.objects.filter(wishlist=wishlist)
+        if product_ids is not None:
+            lines = lines.filter(product_id__in=product_ids)
+        with transaction.atomic():
+            moved = list(lines.values_list("product_id", flat=True))
+            if not moved:
+                return moved
+            self._ensure_saved()
+            CartItem.objects.bulk_create(
+                [CartItem(cart=self, product_id=pk, quantity=1) for pk in moved],
+                ignore_conflicts=True,
+            )
+            lines.filter(product_id__in=moved).delete()
+        cart_count.forget(self.account_id)
+        # The bulk delete sends no m2m_changed, so drop the count here.
+        wishlist_count.forget(wishlist.account_id)
+        return moved
 
     def remove(self, product: Product):
         """Remove a product completely from the cart."""
-        CartItem.objects.filter(cart=self, product=product).delete()
+        self.items().filter(product=product).delete()
+        cart_count.forget(self.account_id)
 
     def clear(self):
         """Remove all products from the cart."""
-        CartItem.objects.filter(cart=self).delete()
+        self.items().delete()
+        cart_count.set(self.account_id, 0)
+
+    def summary(self):
+        """Returns a CartSummary of the current contents of the cart."""
+        return CartSummary(self)
 
     def count(self):
         """Count all items in the cart."""
-        total_quantity = 0
-        for item in CartItem.objects.filter(cart=self):
-            total_quantity += item.quantity
-        return total_quantity
+        return self.summary().quantity
 
     def subtotal_cents(self):
         """Total cents added to the cart."""
-        total = 0
-        items = CartItem.objects.filter(cart=self)
-        for item in items:
-            total += item.total_cents
-        return total
+        return self.summary().subtotal_cents
 
     def subtotal_dollars(self):
-        """Total cents added to the cart."""
-        total = 0
-        items = CartItem.objects.filter(cart=self)
-        for item in items:
-            total += item.total_cents
-        return total // 100
+        """Total dollars added to the cart."""
+        return self.summary().subtotal_dollars
 
     def __str__(self):
         return f"This cart belongs to account {self.account.email}"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account"], name="unique_cart_per_account")
+        ]
+
+
+class StockReservation(models.Model):
+    """Represents stock held for a pending Order until it expires."""
+
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name="reservations"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(_("quantity"))
+    expires_at = models.DateTimeField(_("expires_at"))
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} held until {self.expires_at}"
+
+    @classmethod
+    def held_quantities(cls, product_ids):
+        """Return {product_id: units held by unexpired reservations}."""
+        return dict(
+            cls.objects.filter(product__in=product_ids, expires_at__gt=timezone.now())
+            .values_list("product")
+            .annotate(total=Sum("quantity"))
+        )
+
+    @classmethod
+    def available_to_sell(cls, product_ids):
+        """Return {product_id: stock minus unexpired holds}."""
+        held = cls.held_quantities(product_ids)
+        stock = Product.objects.filter(pk__in=product_ids).values_list("pk", "quantity")
+        return {pk: quantity - held.get(pk, 0) for pk, quantity in stock}
+
+    @classmethod
+    def reserve(cls, quantities):
+        """Check that {product: quantity} can be held, raising OutOfStock.
+
+        Must run inside the transaction that creates the holds. The product
+        rows are locked in primary key order so concurrent checkouts of the
+        same products queue up instead of both passing the check.
+        """
+        ids = sorted(product.pk for product in quantities)
+        list(Product.objects.select_for_update().filter(pk__in=ids).order_by("pk"))
+        available = cls.available_to_sell(ids)
+        missing = [
+            product
+            for product, quantity in quantities.items()
+            if available.get(product.pk, 0) < quantity
+        ]
+        if missing:
+            raise OutOfStock(missing)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "expires_at"], name="reservation_product_idx"
+            ),
+            models.Index(fields=["expires_at"], name="reservation_expires_idx"),
+        ]
+
+
+class CartSummary:
+    """Items, total quantity and subtotal of a Cart.
+
+    Totals come from a single aggregate query and the items from a single
+    select_related fetch, each run at most once per instance.
+    """
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    @cached_property
+    def items(self):
+        """CartItem objects of the cart with their product preloaded."""
+        return list(self.cart.items().select_related("product").order_by("pk"))
+
+    @cached_property
+    def _totals(self):
+        if self.cart.pk is None:
+            return {"total_quantity": 0, "total_cents": 0}
+        return self.cart.items().aggregate(
+            total_quantity=Sum("quantity"),
+            total_cents=Sum(F("quantity") * F("product__price_in_cents")),
+        )
+
+    @property
+    def quantity(self):
+        """Total number of units in the cart."""
+        return self._totals["total_quantity"] or 0
+
+    @property
+    def subtotal_cents(self):
+        """Total price of the cart in cents."""
+        return self._totals["total_cents"] or 0
+
+    @property
+    def subtotal_dollars(self):
+        """Total price of the cart in whole dollars."""
+        return self.subtotal_cents // 100
+
 
 class CartItem(models.Model):
     """Represents an individual items inside an account related cart."""
@@ -287,3 +741,90 @@ class CartItem(models.Model):
                 fields=["cart", "product"], name="unique_product_per_cartItem"
             )
         ]
+
+
+class WebhookEvent(models.Model):
+    """Represents a Stripe event waiting in the webhook inbox."""
+
+    STATUS_PENDING = "pending"
+    STATUS_DONE = "done"
+    STATUS_DEAD = "dead"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_DONE, "Done"),
+        (STATUS_DEAD, "Dead"),
+    ]
+
+    event_id = models.CharField(_("event_id"), max_length=255, unique=True)
+    event_type = models.CharField(_("event_type"), max_length=100)
+    payload = models.JSONField(_("payload"))
+    status = models.CharField(
+        _("status"), max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField(_("attempts"), default=0)
+    available_at = models.DateTimeField(_("available_at"), default=timezone.now)
+    last_error = models.TextField(_("last_error"), blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(_("processed_at"), blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"], name="webhook_status_available_idx"
+            ),
+            models.Index(
+                fields=["status", "created_at"], name="webhook_status_created_idx"
+            ),
+        ]
+
+
+class DailyProductSales(models.Model):
+    """Represents the paid sales of a Product on one day."""
+
+    day = models.DateField(_("day"))
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(_("units"), default=0)
+    gross_cents = models.BigIntegerField(_("gross_cents"), default=0)
+    order_count = models.PositiveIntegerField(_("order_count"), default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.product_id}: {self.units} units"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product"], name="unique_product_per_day"
+            )
+        ]
+        verbose_name_plural = "daily product sales"
+
+
+class DailyCollectionSales(models.Model):
+    """Represents the paid sales of a Collection on one day."""
+
+    day = models.DateField(_("day"))
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE)
+    units = models.PositiveIntegerField(_("units"), default=0)
+    gross_cents = models.BigIntegerField(_("gross_cents"), default=0)
+    order_count = models.PositiveIntegerField(_("order_count"), default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.collection_id}: {self.units} units"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "collection"], name="unique_collection_per_day"
+            )
+        ]
+        verbose_name_plural = "daily collection sales"
+
+
+class SalesRollupState(models.Model):
+    """Represents how far paid orders have been rolled up."""
+
+    high_water_mark = models.DateTimeField(_("high_water_mark"))
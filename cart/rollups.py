@@ -0,0 +1,89 @@
+import datetime
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import (
+    DailyCollectionSales,
+    DailyProductSales,
+    Order,
+    OrderItem,
+    SalesRollupState,
+)
+
+# Orders paid within this lag are left for the next refresh, so a payment
+# whose transaction commits late is never skipped by the high-water mark.
+LAG = datetime.timedelta(minutes=1)
+
+
+def refresh_sales_rollups(now=None):
+    """Roll up orders changed since the high-water mark, returning the days.
+
+    Every day holding a paid order that changed since the last refresh,
+    whether newly paid or since cancelled, is recomputed from that day's
+    paid orders and its rows replaced, so a refresh is idempotent and never
+    rescans days that have not changed.
+    """
+    upto = (now or timezone.now()) - LAG
+    with transaction.atomic():
+        state = SalesRollupState.objects.select_for_update().first()
+        changed = Order.objects.filter(paid_at__isnull=False, updated_at__lte=upto)
+        if state:
+            changed = changed.filter(updated_at__gt=state.high_water_mark)
+        days = sorted(
+            changed.annotate(day=TruncDate("paid_at"))
+            .values_list("day", flat=True)
+            .distinct()
+        )
+
+        if days:
+            tz = timezone.get_current_timezone()
+            items = (
+                OrderItem.objects.filter(
+                    order__status=Order.STATUS_PAID,
+                    order__paid_at__gte=datetime.datetime.combine(
+                        days[0], datetime.time.min, tzinfo=tz
+                    ),
+                    order__paid_at__lt=datetime.datetime.combine(
+                        days[-1] + datetime.timedelta(days=1),
+                        datetime.time.min,
+                        tzinfo=tz,
+                    ),
+                    order__paid_at__lte=upto,
+                )
+                .annotate(day=TruncDate("order__paid_at"))
+                .filter(day__in=days)
+            )
+            # Products and collections left with no paid orders on a day
+            # must drop out of it, so its rows are replaced, not upserted.
+            DailyProductSales.objects.filter(day__in=days).delete()
+            DailyCollectionSales.objects.filter(day__in=days).delete()
+            DailyProductSales.objects.bulk_create(
+                DailyProductSales(product_id=row.pop("product"), **row)
+                for row in _totals(items, "product")
+            )
+            DailyCollectionSales.objects.bulk_create(
+                DailyCollectionSales(
+                    collection_id=row.pop("product__collection"), **row
+                )
+                for row in _totals(items, "product__collection")
+            )
+
+        if state:
+            state.high_water_mark = upto
+            state.save(update_fields=["high_water_mark"])
+        else:
+            SalesRollupState.objects.create(high_water_mark=upto)
+    return days
+
+
+def _totals(items, group):
+    return (
+        items.values("day", group)
+        .annotate(
+            units=Sum("quantity"),
+            gross_cents=Sum(F("quantity") * F("unit_price_cents")),
+            order_count=Count("order", distinct=True),
+        )
+        .order_by()
+    )
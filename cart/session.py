@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.core import signing
+from django.utils.functional import cached_property
+from shop.models import Product
+from .models import CartItem, OutOfStock
+
+COOKIE_NAME = "cart"
+COOKIE_SALT = "cart.session"
+
+
+class SessionCart:
+    """Cart of an anonymous visitor, kept in a signed cookie.
+
+    It offers the same interface as cart.models.Cart, but changes only touch
+    the in-memory quantities. CartMiddleware writes them back to the
+    cookie on the response, so browsing never writes to the database.
+    """
+
+    account_id = None
+
+    def __init__(self, quantities=None):
+        self.quantities = dict(quantities or {})
+        self.modified = False
+
+    @classmethod
+    def from_request(cls, request):
+        """Load the cart from the request cookie, empty if missing or tampered."""
+        try:
+            data = signing.loads(
+                request.COOKIES[COOKIE_NAME],
+                salt=COOKIE_SALT,
+                max_age=settings.CART_COOKIE_AGE,
+            )
+            quantities = {int(pk): int(qty) for pk, qty in data.items() if int(qty) > 0}
+        except (KeyError, AttributeError, ValueError, signing.BadSignature):
+            quantities = {}
+        return cls(quantities)
+
+    def save(self, response):
+        """Write the cart to the response cookie, or drop it once empty."""
+        if not self.quantities:
+            response.delete_cookie(COOKIE_NAME)
+            return
+        response.set_cookie(
+            COOKIE_NAME,
+            signing.dumps(
+                {str(pk): qty for pk, qty in self.quantities.items()},
+                salt=COOKIE_SALT,
+                compress=True,
+            ),
+            max_age=settings.CART_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite="Lax",
+        )
+
+    def add(self, product: Product, quantity=1, replace=False):
+        """Add a product to the cart or update its quantity."""
+        if not replace:
+            quantity += self.quantities.get(product.pk, 0)
+        self.quantities[product.pk] = quantity
+        self.modified = True
+
+    def set_quantities(self, quantities):
+        """Set the quantities of several cart lines at once, zero removing one.
+
+        Stock is checked in one query. Raises OutOfStock, changing nothing, if
+        any quantity exceeds it.
+        """
+        quantities = {
+            pk: quantity for pk, quantity in quantities.items() if pk in self.quantities
+        }
+        short = [
+            product
+            for product in Product.objects.filter(pk__in=quantities)
+            if quantities[product.pk] > product.quantity
+        ]
+        if short:
+            raise OutOfStock(short)
+        for pk, quantity in quantities.items():
+            if quantity <= 0:
+                del self.quantities[pk]
+            else:
+                self.quantities[pk] = quantity
+        self.modified = True
+
+    def remove(self, product: Product):
+        """Remove a product completely from the cart."""
+        if self.quantities.pop(product.pk, None) is not None:
+            self.modified = True
+
+    def clear(self):
+        """Remove all products from the cart."""
+        if self.quantities:
+            self.quantities = {}
+            self.modified = True
+
+    def summary(self):
+        """Returns a SessionCartSummary of the current contents of the cart."""
+        return SessionCartSummary(self)
+
+    def count(self):
+        """Count all items in the cart, without touching the database."""
+        return sum(self.quantities.values())
+
+    def subtotal_cents(self):
+        """Total cents added to the cart."""
+        return self.summary().subtotal_cents
+
+    def subtotal_dollars(self):
+        """Total dollars added to the cart."""
+        return self.summary().subtotal_dollars
+
+
+class SessionCartSummary:
+    """Items, total quantity and subtotal of a SessionCart.
+
+    Items are unsaved CartItem objects, so templates render both kinds of
+    cart the same way. Products are fetched in a single query.
+    """
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    @cached_property
+    def items(self):
+        """CartItem objects of the cart in the order products were added."""
+        products = Product.objects.in_bulk(self.cart.quantities)
+        return [
+            CartItem(product=products[pk], quantity=quantity)
+            for pk, quantity in self.cart.quantities.items()
+            if pk in products
+        ]
+
+    @property
+    def quantity(self):
+        """Total number of units in the cart."""
+        return sum(item.quantity for item in self.items)
+
+    @property
+    def subtotal_cents(self):
+        """Total price of the cart in cents."""
+        return sum(item.total_cents for item in self.items)
+
+    @property
+    def subtotal_dollars(self):
+        """Total price of the cart in whole dollars."""
+        return self.subtotal_cents // 100
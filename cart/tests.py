@@ -1,10 +1,72 @@
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
 from unittest.mock import patch
-from django.test import TestCase, RequestFactory
+import stripe
+from PIL import Image
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from account.models import Account
-from cart.models import Order, Cart, CartItem
+from cart.admin import MAX_DASHBOARD_DAYS
+from cart.counter import cart_count
+from cart.exports import stream_orders
+from cart.helpers import get_cart, get_cart_summary
+from cart.middleware import CartMiddleware
+from cart.inbox import (
+    BACKOFF_BASE,
+    BACKOFF_MAX,
+    MAX_ATTEMPTS,
+    RETENTION,
+    backoff,
+    claim_batch,
+    enqueue,
+    process_batch,
+)
+from cart.models import (
+    Order,
+    OrderItem,
+    Cart,
+    CartItem,
+    DailyCollectionSales,
+    DailyProductSales,
+    OutOfStock,
+    StockReservation,
+    WebhookEvent,
+)
+from cart.rollups import refresh_sales_rollups
+from cart.session import COOKIE_NAME, SessionCart
+from cart.webhooks import handle_event
 from shop.models import Product, Collection
 
 
+class StubSession:
+    """Local stand-in for the stripe.checkout.Session returned by Stripe."""
+
+    created = 0
+
+    def __init__(self, **kwargs):
+        StubSession.created += 1
+        self.id = f"cs_test_{StubSession.created}"
+        self.url = f"https://stripe.test/{self.id}"
+        self.expires_at = kwargs.get("expires_at", int(time.time()) + 24 * 60 * 60)
+
+
 class BaseCartSetupMixin:
     """To setup for the Cart, CartItem, Order and OrderItem tests."""
 
@@ -20,11 +82,13 @@ class BaseCartSetupMixin:
         self.product1 = Product.objects.create(
             name="Mug",
             price_in_cents=1500,
+            quantity=10,
             collection=self.collection,
         )
         self.product2 = Product.objects.create(
             name="Plate",
             price_in_cents=2500,
+            quantity=10,
             collection=self.collection,
         )
 
@@ -155,6 +219,64 @@ class OrderModelTests(BaseCartSetupMixin, TestCase):
         self.assertEqual(order.billing_city, "BCity")
         self.assertEqual(order.shipping_city, "SCity")
 
+    def fulfill(self, order):
+        return order.fulfill(
+            name="Juan",
+            email="[email protected]",
+            payment_id=f"pi_{order.pk}",
+            total_cents=order.total_cents,
+            billing_address_line1="B1",
+            billing_address_line2="B2",
+            billing_city="BCity",
+            billing_postal_code="BZIP",
+            billing_country="BCountry",
+            shipping_address_line1="S1",
+            shipping_address_line2="S2",
+            shipping_city="SCity",
+            shipping_postal_code="SZIP",
+            shipping_country="SCountry",
+        )
+
+    def order_with(self, *lines):
+        order = Order.objects.create(account=self.account, total_cents=0)
+        for product, quantity in lines:
+            OrderItem.objects.create(
+                order=order,
+                product=product,
+                quantity=quantity,
+                unit_price_cents=product.price_in_cents,
+            )
+        return order
+
+    def test_fulfill_marks_paid_and_decrements_stock(self):
+        Product.objects.filter(pk=self.product1.pk).update(quantity=5)
+        Product.objects.filter(pk=self.product2.pk).update(quantity=1)
+        order = self.order_with((self.product1, 2), (self.product2, 1))
+
+        # Savepoint, order write, hold release, line fetch, one UPDATE per
+        # product and the savepoint release.
+        with self.assertNumQueries(7):
+            oversold = self.fulfill(order)
+
+        self.assertEqual(oversold, [])
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_PAID)
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 3)
+        self.assertEqual(self.product2.quantity, 0)
+
+    def test_fulfill_reports_oversold_lines(self):
+        Product.objects.filter(pk=self.product1.pk).update(quantity=1)
+        order = self.order_with((self.product1, 2))
+
+        with self.assertLogs("cart.models", "WARNING"):
+            oversold = self.fulfill(order)
+
+        self.assertEqual(oversold, [(self.product1.pk, 2)])
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 1)
+
     def test_order_str(self):
         order = Order.objects.create(
             account=self.account,
@@ -190,9 +312,7 @@ class OrderCreateFromCartTests(BaseCartSetupMixin, TestCase):
         request = self.factory.post("/fake/")
         request.user = self.account
 
-        mock_stripe.return_value = type(
-            "DummySession", (), {"url": "https://stripe.test"}
-        )()
+        mock_stripe.return_value = StubSession()
 
         session, order = Order.create_from_cart(request, self.cart, self.account)
 
@@ -205,3 +325,1409 @@ class OrderCreateFromCartTests(BaseCartSetupMixin, TestCase):
         self.assertEqual(item.quantity, 2)
         self.assertEqual(item.unit_price_cents, self.product1.price_in_cents)
         self.assertTrue(mock_stripe.called)
+
+    def create_with_items(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Bowl {i}",
+                price_in_cents=1000,
+                quantity=2,
+                collection=self.collection,
+            )
+            self.cart.add(product, quantity=2)
+        request = self.factory.post("/fake/")
+        request.user = self.account
+        with CaptureQueriesContext(connection) as queries:
+            Order.create_from_cart(request, self.cart, self.account)
+        self.cart.clear()
+        Order.objects.all().delete()
+        return len(queries)
+
+    @patch("cart.models.stripe.checkout.Session.create")
+    def test_create_from_cart_query_count_is_constant(self, mock_stripe):
+        mock_stripe.side_effect = StubSession
+        self.assertEqual(self.create_with_items(1), self.create_with_items(30))
+
+    @patch("cart.models.stripe.checkout.Session.create")
+    def test_create_from_cart_stripe_failure_leaves_no_order(self, mock_stripe):
+        self.cart.add(self.product1, quantity=2)
+        request = self.factory.post("/fake/")
+        request.user = self.account
+        mock_stripe.side_effect = stripe.error.APIConnectionError("down")
+
+        with self.assertRaises(stripe.error.StripeError):
+            Order.create_from_cart(request, self.cart, self.account)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+
+class CartSummaryTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the CartSummary computation."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.factory = RequestFactory()
+        self.client.force_login(self.account)
+
+    def add_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                name=f"Bowl {i}",
+                price_in_cents=1000,
+                image="products/bowl.jpg",
+                collection=self.collection,
+            )
+            self.cart.add(product, quantity=2)
+
+    def test_summary_totals(self):
+        self.cart.add(self.product1, quantity=2)
+        self.cart.add(self.product2, quantity=1)
+        summary = self.cart.summary()
+        with self.assertNumQueries(2):
+            self.assertEqual(summary.quantity, 3)
+            self.assertEqual(summary.subtotal_cents, 5500)
+            self.assertEqual(summary.subtotal_dollars, 55)
+            self.assertEqual(len(summary.items), 2)
+            self.assertEqual(
+                [item.product for item in summary.items],
+                [
+                    self.product1,
+                    self.product2,
+                ],
+            )
+
+    def test_empty_summary(self):
+        summary = self.cart.summary()
+        self.assertEqual(summary.quantity, 0)
+        self.assertEqual(summary.subtotal_cents, 0)
+        self.assertEqual(summary.items, [])
+
+    def test_summary_is_memoized_per_request(self):
+        request = self.factory.get("/")
+        request.user = self.account
+        self.assertIs(get_cart_summary(request), get_cart_summary(request))
+
+    def queries_for(self, url, item_count):
+        self.add_products(item_count)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        CartItem.objects.filter(cart=self.cart).delete()
+        return len(queries)
+
+    def test_cart_view_query_count_is_constant(self):
+        url = reverse("cart:cart")
+        self.client.get(url)
+        self.assertEqual(self.queries_for(url, 1), self.queries_for(url, 20))
+
+    def test_checkout_view_query_count_is_constant(self):
+        url = reverse("cart:checkout")
+        self.client.get(url)
+        self.assertEqual(self.queries_for(url, 1), self.queries_for(url, 20))
+
+
+class CartCountBadgeTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the cached cart count badge."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(self.account)
+
+    def badge_count(self):
+        return self.client.get(reverse("about")).context["cart_count"]
+
+    def test_count_is_rebuilt_on_miss_and_kept_up_to_date(self):
+        self.cart.add(self.product1, quantity=2)
+        self.assertIsNone(cart_count.peek(self.account.pk))
+        self.assertEqual(self.badge_count(), 2)
+
+        self.cart.add(self.product1, quantity=3)
+        self.cart.add(self.product2, quantity=1)
+        self.assertEqual(cart_count.peek(self.account.pk), 6)
+
+        self.cart.add(self.product1, quantity=1, replace=True)
+        self.assertEqual(self.badge_count(), 2)
+
+        self.cart.remove(self.product2)
+        self.assertEqual(self.badge_count(), 1)
+
+        self.cart.clear()
+        self.assertEqual(cart_count.peek(self.account.pk), 0)
+
+    def test_cached_page_render_runs_no_cart_queries(self):
+        self.cart.add(self.product1, quantity=2)
+        url = reverse("about")
+        self.client.get(url)
+        # Only the session and the authenticated account are loaded.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.context["cart_count"], 2)
+        self.assertContains(response, "bg-amber-600 text-white text-xs")
+
+    def test_anonymous_render_runs_no_queries(self):
+        self.client.logout()
+        url = reverse("about")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.context["cart_count"], 0)
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    """To test that concurrent add-to-cart requests never lose an update."""
+
+    THREADS = 8
+    ADDS_PER_THREAD = 25
+
+    def setUp(self):
+        cache.clear()
+        self.account = Account.objects.create_user(
+            username="juan", email="[email protected]", password="testpass123"
+        )
+        collection = Collection.objects.create(name="Default")
+        self.product = Product.objects.create(
+            name="Mug", price_in_cents=1500, collection=collection
+        )
+        self.cart = Cart.objects.create(account=self.account)
+
+    def hammer(self, action):
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.ADDS_PER_THREAD):
+                    action()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_adds_are_all_counted(self):
+        self.hammer(lambda: self.cart.add(self.product, quantity=1))
+        item = CartItem.objects.get(cart=self.cart, product=self.product)
+        self.assertEqual(item.quantity, self.THREADS * self.ADDS_PER_THREAD)
+
+    def test_concurrent_replaces_keep_a_single_line(self):
+        self.hammer(lambda: self.cart.add(self.product, quantity=3, replace=True))
+        item = CartItem.objects.get(cart=self.cart, product=self.product)
+        self.assertEqual(item.quantity, 3)
+
+
+class CheckoutSessionReuseTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test reuse of open Checkout Sessions."""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.request = self.factory.post("/fake/")
+        self.request.user = self.account
+        self.cart.add(self.product1, quantity=2)
+        patcher = patch("cart.models.stripe.checkout.Session.create", StubSession)
+        self.create_session = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("cart.models.stripe.checkout.Session.expire")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def checkout(self):
+        return Order.create_from_cart(self.request, self.cart, self.account)
+
+    def test_unchanged_cart_reuses_order_and_session(self):
+        session, order = self.checkout()
+        with self.assertNumQueries(2):
+            reused_session, reused_order = self.checkout()
+        self.assertEqual(reused_order, order)
+        self.assertEqual(reused_session.url, session.url)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_changed_quantity_creates_new_session(self):
+        _, order = self.checkout()
+        self.cart.add(self.product1, quantity=1)
+        _, new_order = self.checkout()
+        self.assertNotEqual(new_order, order)
+
+    def test_changed_price_creates_new_session(self):
+        _, order = self.checkout()
+        Product.objects.filter(pk=self.product1.pk).update(price_in_cents=1700)
+        _, new_order = self.checkout()
+        self.assertNotEqual(new_order, order)
+        self.assertEqual(new_order.total_cents, 3400)
+
+    def test_expiring_session_is_not_reused(self):
+        _, order = self.checkout()
+        Order.objects.filter(pk=order.pk).update(
+            checkout_expires_at=timezone.now() + datetime.timedelta(minutes=1)
+        )
+        _, new_order = self.checkout()
+        self.assertNotEqual(new_order, order)
+
+    def test_paid_order_is_not_reused(self):
+        _, order = self.checkout()
+        order.set_status("paid")
+        _, new_order = self.checkout()
+        self.assertNotEqual(new_order, order)
+
+
+@patch.dict(os.environ, {"STRIPE_WEBHOOK_SECRET": "whsec_test"})
+class WebhookInboxTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the Stripe webhook inbox."""
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(account=self.account, total_cents=1500)
+
+    def completed_event(self, event_id="evt_1", order_id=None):
+        return {
+            "id": event_id,
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "client_reference_id": str(order_id or self.order.id),
+                    "payment_intent": f"pi_{event_id}",
+                }
+            },
+        }
+
+    def post_event(self, event):
+        with patch("cart.webhooks.stripe.Webhook.construct_event"):
+            return self.client.post(
+                reverse("cart:stripe_webhook"),
+                data=json.dumps(event),
+                content_type="application/json",
+                HTTP_STRIPE_SIGNATURE="t=1,v1=test",
+            )
+
+    def test_webhook_queues_event_without_processing_it(self):
+        response = self.post_event(self.completed_event())
+        self.assertEqual(response.status_code, 200)
+        event = WebhookEvent.objects.get(event_id="evt_1")
+        self.assertEqual(event.status, WebhookEvent.STATUS_PENDING)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PENDING)
+
+    def test_webhook_ignores_redelivered_event(self):
+        self.post_event(self.completed_event())
+        response = self.post_event(self.completed_event())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_redelivered_event_costs_a_single_lookup(self):
+        enqueue(self.completed_event())
+        with self.assertNumQueries(1):
+            self.assertFalse(enqueue(self.completed_event()))
+
+    def test_paid_order_is_not_fulfilled_again(self):
+        enqueue(self.completed_event("evt_1"))
+        process_batch(handle_event)
+        enqueue(self.completed_event("evt_2"))
+        with patch.object(Order, "fulfill") as fulfill:
+            process_batch(handle_event)
+        fulfill.assert_not_called()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_id, "pi_evt_1")
+
+    def test_prune_deletes_only_old_finished_events(self):
+        for event_id in ("evt_old_done", "evt_old_pending", "evt_new_done"):
+            enqueue(self.completed_event(event_id))
+        WebhookEvent.objects.exclude(event_id="evt_old_pending").update(
+            status=WebhookEvent.STATUS_DONE
+        )
+        WebhookEvent.objects.filter(event_id__startswith="evt_old").update(
+            created_at=timezone.now() - RETENTION - datetime.timedelta(days=1)
+        )
+
+        out = io.StringIO()
+        call_command("prune_webhooks", "--batch-size", "1", stdout=out)
+
+        self.assertIn("Deleted 1 events.", out.getvalue())
+        self.assertEqual(
+            set(WebhookEvent.objects.values_list("event_id", flat=True)),
+            {"evt_old_pending", "evt_new_done"},
+        )
+
+    def test_webhook_rejects_invalid_signature(self):
+        response = self.client.post(
+            reverse("cart:stripe_webhook"),
+            data=json.dumps(self.completed_event()),
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE="t=1,v1=wrong",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_worker_fulfills_order(self):
+        enqueue(self.completed_event())
+        call_command("process_webhooks", "--once", stdout=io.StringIO())
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+        self.assertEqual(self.order.payment_id, "pi_evt_1")
+        event = WebhookEvent.objects.get(event_id="evt_1")
+        self.assertEqual(event.status, WebhookEvent.STATUS_DONE)
+        self.assertIsNotNone(event.processed_at)
+
+    def test_claimed_events_are_leased_to_one_worker(self):
+        enqueue(self.completed_event("evt_1"))
+        enqueue(self.completed_event("evt_2"))
+        self.assertEqual(len(claim_batch(1)), 1)
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_failed_event_is_retried_with_backoff_then_dead_lettered(self):
+        enqueue(self.completed_event(order_id=999))
+
+        self.assertEqual(process_batch(handle_event), 1)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEvent.STATUS_PENDING)
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("DoesNotExist", event.last_error)
+        self.assertGreater(event.available_at, timezone.now())
+        self.assertEqual(process_batch(handle_event), 0)
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            WebhookEvent.objects.update(available_at=timezone.now())
+            process_batch(handle_event)
+        event.refresh_from_db()
+        self.assertEqual(event.status, WebhookEvent.STATUS_DEAD)
+        self.assertEqual(event.attempts, MAX_ATTEMPTS)
+
+    def test_backoff_grows_exponentially_up_to_a_cap(self):
+        self.assertEqual(backoff(1), BACKOFF_BASE)
+        self.assertEqual(backoff(3), BACKOFF_BASE * 4)
+        self.assertEqual(backoff(30), BACKOFF_MAX)
+
+
+class StockReservationTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test stock holds during checkout."""
+
+    def setUp(self):
+        super().setUp()
+        self.request = RequestFactory().post("/fake/")
+        self.request.user = self.account
+        self.other = Account.objects.create_user(
+            username="laura", email="[email protected]", password="testpass123"
+        )
+        self.other_cart = Cart.objects.create(account=self.other)
+        Product.objects.filter(pk=self.product1.pk).update(quantity=3)
+        patcher = patch("cart.models.stripe.checkout.Session.create", StubSession)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("cart.models.stripe.checkout.Session.expire")
+        self.expire_session = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def available(self):
+        return StockReservation.available_to_sell([self.product1.pk])[self.product1.pk]
+
+    def test_checkout_holds_stock_until_session_expiry(self):
+        self.cart.add(self.product1, quantity=2)
+        _, order = Order.create_from_cart(self.request, self.cart, self.account)
+
+        reservation = order.reservations.get()
+        self.assertEqual(reservation.quantity, 2)
+        self.assertEqual(
+            int(reservation.expires_at.timestamp()),
+            int(order.checkout_expires_at.timestamp()),
+        )
+        self.assertEqual(self.available(), 1)
+
+    def test_stripe_expiry_clears_its_minimum_when_called(self):
+        lifetimes = []
+
+        def create(**kwargs):
+            lifetimes.append(kwargs["expires_at"] - time.time())
+            return StubSession(**kwargs)
+
+        self.cart.add(self.product1)
+        with patch("cart.models.stripe.checkout.Session.create", create):
+            Order.create_from_cart(self.request, self.cart, self.account)
+        self.assertGreaterEqual(lifetimes[0], 30 * 60)
+
+    def test_slow_reservation_extends_the_holds_with_the_session(self):
+        clock = [timezone.now()]
+        reserve = StockReservation.reserve
+
+        def slow_reserve(quantities):
+            reserve(quantities)
+            clock[0] += datetime.timedelta(minutes=5)
+
+        self.cart.add(self.product1)
+        with (
+            patch("cart.models.timezone.now", lambda: clock[0]),
+            patch.object(StockReservation, "reserve", slow_reserve),
+        ):
+            _, order = Order.create_from_cart(self.request, self.cart, self.account)
+        reservation = order.reservations.get()
+        self.assertEqual(reservation.expires_at, order.checkout_expires_at)
+        self.assertGreaterEqual(
+            order.checkout_expires_at - clock[0], datetime.timedelta(minutes=30)
+        )
+
+    def test_held_stock_cannot_be_checked_out_again(self):
+        self.cart.add(self.product1, quantity=2)
+        Order.create_from_cart(self.request, self.cart, self.account)
+        self.other_cart.add(self.product1, quantity=2)
+
+        with self.assertRaises(OutOfStock) as raised:
+            Order.create_from_cart(self.request, self.other_cart, self.other)
+        self.assertEqual(raised.exception.products, [self.product1])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        self.cart.add(self.product1, quantity=3)
+        Order.create_from_cart(self.request, self.cart, self.account)
+        StockReservation.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.available(), 3)
+
+        out = io.StringIO()
+        call_command("release_reservations", stdout=out)
+        self.assertIn("Released 1 reservations.", out.getvalue())
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cancel_releases_holds(self):
+        self.cart.add(self.product1, quantity=3)
+        _, order = Order.create_from_cart(self.request, self.cart, self.account)
+        order.set_status("cancelled")
+        self.assertEqual(self.available(), 3)
+
+    def test_changed_cart_checkout_releases_the_earlier_one(self):
+        Product.objects.filter(pk=self.product1.pk).update(quantity=1)
+        self.cart.add(self.product1)
+        _, first = Order.create_from_cart(self.request, self.cart, self.account)
+        self.cart.add(self.product2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            _, second = Order.create_from_cart(self.request, self.cart, self.account)
+
+        self.expire_session.assert_called_once_with(first.checkout_session_id)
+        first.refresh_from_db()
+        self.assertEqual(first.status, Order.STATUS_CANCELLED)
+        self.assertFalse(first.reservations.exists())
+        self.assertEqual(second.reservations.count(), 2)
+        self.assertEqual(self.available(), 0)
+
+    def test_failed_checkout_leaves_the_earlier_one_open(self):
+        self.cart.add(self.product1)
+        _, first = Order.create_from_cart(self.request, self.cart, self.account)
+        Product.objects.filter(pk=self.product2.pk).update(quantity=0)
+        self.cart.add(self.product2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(OutOfStock):
+                Order.create_from_cart(self.request, self.cart, self.account)
+
+        self.expire_session.assert_not_called()
+        first.refresh_from_db()
+        self.assertEqual(first.status, Order.STATUS_PENDING)
+        self.assertTrue(first.reservations.exists())
+
+    def test_released_order_is_not_reused(self):
+        self.cart.add(self.product1)
+        _, first = Order.create_from_cart(self.request, self.cart, self.account)
+        self.cart.add(self.product2)
+        Order.create_from_cart(self.request, self.cart, self.account)
+        self.cart.remove(self.product2)
+
+        _, third = Order.create_from_cart(self.request, self.cart, self.account)
+        self.assertNotEqual(third, first)
+
+    def test_unexpirable_session_is_logged(self):
+        self.cart.add(self.product1)
+        Order.create_from_cart(self.request, self.cart, self.account)
+        self.cart.add(self.product2)
+        self.expire_session.side_effect = stripe.error.InvalidRequestError(
+            "not expirable", None
+        )
+
+        with (
+            self.assertLogs("cart.models", "WARNING"),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            _, second = Order.create_from_cart(self.request, self.cart, self.account)
+        self.assertEqual(second.status, Order.STATUS_PENDING)
+
+    def test_cancel_view_releases_only_the_named_order(self):
+        self.cart.add(self.product1, quantity=3)
+        _, order = Order.create_from_cart(self.request, self.cart, self.account)
+        other = Order.objects.create(account=self.account, total_cents=1500)
+        self.client.force_login(self.account)
+        url = reverse("cart:cancel")
+
+        self.client.get(url)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_PENDING)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(url, {"order": order.pk})
+
+        self.expire_session.assert_called_once_with(order.checkout_session_id)
+        order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_CANCELLED)
+        self.assertEqual(other.status, Order.STATUS_PENDING)
+        self.assertEqual(self.available(), 3)
+
+    def test_fulfill_converts_holds_into_sold_stock(self):
+        self.cart.add(self.product1, quantity=2)
+        _, order = Order.create_from_cart(self.request, self.cart, self.account)
+        enqueue(
+            {
+                "id": "evt_1",
+                "type": "checkout.session.completed",
+                "data": {
+                    "object": {
+                        "client_reference_id": str(order.id),
+                        "payment_intent": "pi_1",
+                    }
+                },
+            }
+        )
+        process_batch(handle_event)
+
+        self.assertFalse(order.reservations.exists())
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.quantity, 1)
+        self.assertEqual(self.available(), 1)
+
+    def test_checkout_view_reports_out_of_stock(self):
+        account = Account.objects.create_user(
+            username="melissa",
+            email="[email protected]",
+            password="testpass123",
+            billing_address_line1="1 Clay St",
+            billing_city="Montreal",
+            billing_postal_code="H1H 1H1",
+            billing_country="Canada",
+            shipping_address_line1="1 Clay St",
+            shipping_city="Montreal",
+            shipping_postal_code="H1H 1H1",
+            shipping_country="Canada",
+        )
+        Cart.objects.create(account=account).add(self.product1, quantity=4)
+        self.client.force_login(account)
+
+        response = self.client.post(reverse("cart:create_checkout_session"))
+
+        self.assertRedirects(
+            response, reverse("cart:cart"), fetch_redirect_response=False
+        )
+        self.assertFalse(Order.objects.exists())
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    """To test that parallel checkouts never hold more than the stock."""
+
+    CHECKOUTS = 50
+    STOCK = 5
+
+    def setUp(self):
+        cache.clear()
+        collection = Collection.objects.create(name="Default")
+        self.product = Product.objects.create(
+            name="Moon Jar",
+            price_in_cents=90000,
+            quantity=self.STOCK,
+            collection=collection,
+        )
+        self.carts = []
+        for i in range(self.CHECKOUTS):
+            account = Account.objects.create_user(
+                username=f"buyer{i}", email=f"buyer{i}@example.com"
+            )
+            cart = Cart.objects.create(account=account)
+            cart.add(self.product, quantity=1)
+            self.carts.append(cart)
+
+    @patch("cart.models.stripe.checkout.Session.create", StubSession)
+    def test_parallel_checkouts_do_not_oversell(self):
+        barrier = threading.Barrier(self.CHECKOUTS)
+        outcomes = []
+
+        def checkout(cart):
+            request = RequestFactory().post("/fake/")
+            try:
+                barrier.wait()
+                Order.create_from_cart(request, cart, cart.account)
+                outcomes.append("held")
+            except OutOfStock:
+                outcomes.append("out of stock")
+            except Exception as exc:
+                outcomes.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=checkout, args=(cart,)) for cart in self.carts
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count("held"), self.STOCK)
+        self.assertEqual(outcomes.count("out of stock"), self.CHECKOUTS - self.STOCK)
+        self.assertEqual(StockReservation.objects.count(), self.STOCK)
+        self.assertEqual(
+            StockReservation.available_to_sell([self.product.pk])[self.product.pk], 0
+        )
+
+
+class CancelStaleOrdersCommandTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the stale order sweeper."""
+
+    def create_order(self, status=Order.STATUS_PENDING, hours_old=0):
+        order = Order.objects.create(
+            account=self.account, total_cents=1500, status=status
+        )
+        Order.objects.filter(pk=order.pk).update(
+            created_at=timezone.now() - datetime.timedelta(hours=hours_old)
+        )
+        return order
+
+    def test_cancels_old_pending_orders_in_batches(self):
+        stale = [self.create_order(hours_old=48) for _ in range(5)]
+        recent = self.create_order(hours_old=1)
+        paid = self.create_order(status=Order.STATUS_PAID, hours_old=48)
+        StockReservation.objects.create(
+            order=stale[0],
+            product=self.product1,
+            quantity=1,
+            expires_at=timezone.now(),
+        )
+
+        out = io.StringIO()
+        call_command("cancel_stale_orders", "--batch-size", "2", stdout=out)
+
+        output = out.getvalue()
+        self.assertIn("Batch 1: cancelled 2 orders.", output)
+        self.assertIn("Batch 3: cancelled 1 orders.", output)
+        self.assertIn("Cancelled 5 orders in", output)
+        self.assertEqual(
+            Order.objects.filter(status=Order.STATUS_CANCELLED).count(), len(stale)
+        )
+        recent.refresh_from_db()
+        paid.refresh_from_db()
+        self.assertEqual(recent.status, Order.STATUS_PENDING)
+        self.assertEqual(paid.status, Order.STATUS_PAID)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_age_is_configurable(self):
+        order = self.create_order(hours_old=3)
+        call_command("cancel_stale_orders", "--hours", "2", stdout=io.StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.STATUS_CANCELLED)
+
+
+class OrderDetailsCacheTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the order details render cache."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.order = Order.objects.create(
+            account=self.account, total_cents=3000, status=Order.STATUS_PAID
+        )
+        OrderItem.objects.create(
+            order=self.order,
+            product=self.product1,
+            quantity=2,
+            unit_price_cents=1500,
+        )
+        self.url = reverse("cart:order_details", args=[self.order.id])
+        self.client.force_login(self.account)
+
+    def test_paid_order_is_served_from_cache(self):
+        self.client.get(self.url)
+        OrderItem.objects.filter(order=self.order).update(quantity=5)
+        # Session, account and the ownership check only.
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, self.product1.name)
+        self.assertContains(response, '<span class="font-semibold">2</span>')
+
+    def test_pending_order_bypasses_cache(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.STATUS_PENDING)
+        self.client.get(self.url)
+        OrderItem.objects.filter(order=self.order).update(quantity=5)
+        response = self.client.get(self.url)
+        self.assertContains(response, '<span class="font-semibold">5</span>')
+
+    def test_cached_order_is_not_served_to_another_account(self):
+        self.client.get(self.url)
+        other = Account.objects.create_user(
+            username="laura", email="[email protected]", password="testpass123"
+        )
+        self.client.force_login(other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_is_keyed_per_language(self):
+        self.client.get(self.url)
+        response = self.client.get(
+            reverse("cart:order_details", args=[self.order.id]).replace(
+                "/en/", "/fr/", 1
+            )
+        )
+        self.assertContains(response, "/fr/account/")
+
+    def test_cached_order_images_survive_an_image_change(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            for color in ("orange", "blue"):
+                buffer = io.BytesIO()
+                Image.new("RGB", (400, 300), color).save(buffer, "JPEG")
+                self.product1.image = SimpleUploadedFile(
+                    f"{color}.jpg", buffer.getvalue(), content_type="image/jpeg"
+                )
+                self.product1.save()
+                call_command("build_image_derivatives", workers=1, stdout=io.StringIO())
+                response = self.client.get(self.url)
+
+            urls = re.findall(r"/media/(\S+?\.(?:avif|webp|jpeg))", response.text)
+            self.assertIn("orange", " ".join(urls))
+            for url in urls:
+                self.assertTrue(default_storage.exists(url), url)
+
+
+class SalesRollupTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the daily sales rollups."""
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+
+    def create_paid_order(self, product, quantity, days_ago=0):
+        order = Order.objects.create(
+            account=self.account,
+            total_cents=product.price_in_cents * quantity,
+            status=Order.STATUS_PAID,
+            paid_at=self.now - datetime.timedelta(days=days_ago, minutes=5),
+        )
+        Order.objects.filter(pk=order.pk).update(updated_at=order.paid_at)
+        OrderItem.objects.create(
+            order=order,
+            product=product,
+            quantity=quantity,
+            unit_price_cents=product.price_in_cents,
+        )
+        return order
+
+    def test_refresh_rolls_up_paid_orders_per_day(self):
+        self.create_paid_order(self.product1, 2)
+        self.create_paid_order(self.product1, 1)
+        self.create_paid_order(self.product2, 1, days_ago=1)
+        Order.objects.create(
+            account=self.account, total_cents=1500, status=Order.STATUS_PENDING
+        )
+
+        self.assertEqual(len(refresh_sales_rollups(now=self.now)), 2)
+        mugs = DailyProductSales.objects.get(product=self.product1)
+        self.assertEqual((mugs.units, mugs.gross_cents, mugs.order_count), (3, 4500, 2))
+        self.assertEqual(
+            sorted(DailyCollectionSales.objects.values_list("units", "gross_cents")),
+            [(1, 2500), (3, 4500)],
+        )
+
+    def test_refresh_only_recomputes_days_with_new_payments(self):
+        self.create_paid_order(self.product1, 1, days_ago=3)
+        refresh_sales_rollups(now=self.now)
+        self.now += datetime.timedelta(minutes=10)
+        self.create_paid_order(self.product1, 2)
+
+        days = refresh_sales_rollups(now=self.now)
+        self.assertEqual(
+            days, [timezone.localdate(self.now - datetime.timedelta(minutes=5))]
+        )
+        self.assertEqual(DailyProductSales.objects.count(), 2)
+
+    def test_refresh_is_idempotent(self):
+        self.create_paid_order(self.product1, 2)
+        refresh_sales_rollups(now=self.now)
+        self.assertEqual(refresh_sales_rollups(now=self.now), [])
+        self.assertEqual(DailyProductSales.objects.get().units, 2)
+
+    def test_cancelling_a_paid_order_recomputes_its_day(self):
+        self.create_paid_order(self.product1, 2)
+        order = self.create_paid_order(self.product2, 1)
+        refresh_sales_rollups(now=self.now)
+        self.assertEqual(DailyProductSales.objects.count(), 2)
+
+        order.set_status(Order.STATUS_CANCELLED)
+        days = refresh_sales_rollups(now=timezone.now() + datetime.timedelta(minutes=2))
+
+        self.assertEqual(days, [timezone.localdate(order.paid_at)])
+        self.assertEqual(DailyProductSales.objects.get().product, self.product1)
+        self.assertEqual(DailyCollectionSales.objects.get().units, 2)
+
+    def test_set_status_paid_records_paid_at(self):
+        order = Order.objects.create(
+            account=self.account, total_cents=1500, status=Order.STATUS_PENDING
+        )
+        order.set_status(Order.STATUS_PAID)
+        order.refresh_from_db()
+        self.assertIsNotNone(order.paid_at)
+
+    def test_command_reports_refreshed_days(self):
+        self.create_paid_order(self.product1, 1)
+        out = io.StringIO()
+        call_command("refresh_sales_rollups", stdout=out)
+        self.assertIn("Refreshed 1 days.", out.getvalue())
+
+    def test_dashboard_reads_rollups_only(self):
+        for days_ago in range(5):
+            self.create_paid_order(self.product1, 1, days_ago=days_ago)
+        refresh_sales_rollups(now=self.now)
+        admin_user = Account.objects.create_superuser(
+            username="admin", email="[email protected]", password="testpass123"
+        )
+        self.client.force_login(admin_user)
+        url = reverse("admin:cart_dailyproductsales_changelist")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"days": 7})
+        self.assertContains(response, "Sales dashboard")
+        self.assertContains(response, "$75.00")
+        self.assertFalse(
+            any('"cart_order' in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_dashboard_falls_back_on_bad_or_huge_days(self):
+        admin_user = Account.objects.create_superuser(
+            username="admin", email="[email protected]", password="testpass123"
+        )
+        self.client.force_login(admin_user)
+        url = reverse("admin:cart_dailyproductsales_changelist")
+
+        response = self.client.get(url, {"days": "abc"})
+        self.assertEqual(response.context["days"], 30)
+        response = self.client.get(url, {"days": 1000000})
+        self.assertEqual(response.context["days"], MAX_DASHBOARD_DAYS)
+
+
+class OrderExportTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the streaming order export."""
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(
+            account=self.account,
+            total_cents=5500,
+            status=Order.STATUS_PAID,
+            payment_id="pi_1",
+        )
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=self.order,
+                    product=self.product1,
+                    quantity=2,
+                    unit_price_cents=1500,
+                ),
+                OrderItem(
+                    order=self.order,
+                    product=self.product2,
+                    quantity=1,
+                    unit_price_cents=2500,
+                ),
+            ]
+        )
+
+    def export(self, *args):
+        out = io.StringIO()
+        call_command("export_orders", *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_has_a_row_per_order_line(self):
+        rows = list(csv.DictReader(io.StringIO(self.export())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["product_name"], "Mug")
+        self.assertEqual(rows[0]["email"], self.account.email)
+        self.assertEqual(rows[1]["payment_id"], "pi_1")
+
+    def test_jsonl_has_an_object_per_order_line(self):
+        lines = self.export("--format", "jsonl").splitlines()
+        self.assertEqual([json.loads(line)["quantity"] for line in lines], [2, 1])
+
+    def test_date_range_limits_the_export(self):
+        Order.objects.filter(pk=self.order.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=10)
+        )
+        today = timezone.localdate().isoformat()
+        self.assertEqual(self.export("--format", "jsonl", "--since", today), "")
+        self.assertEqual(
+            len(self.export("--format", "jsonl", "--until", today).splitlines()), 2
+        )
+
+    def test_admin_action_streams_the_selected_orders(self):
+        admin_user = Account.objects.create_superuser(
+            username="admin", email="[email protected]", password="testpass123"
+        )
+        self.client.force_login(admin_user)
+        response = self.client.post(
+            reverse("admin:cart_order_changelist"),
+            {"action": "export_csv", "_selected_action": [self.order.pk]},
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment", response["Content-Disposition"])
+        body = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_peak_memory_does_not_grow_with_the_export(self):
+        orders = Order.objects.bulk_create(
+            Order(account=self.account, total_cents=3000) for _ in range(20000)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=self.product1, quantity=2, unit_price_cents=1500
+            )
+            for order in orders
+        )
+
+        def peak_memory(orders):
+            tracemalloc.start()
+            try:
+                for _ in stream_orders("csv", orders, chunk_size=500):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small = peak_memory(Order.objects.filter(pk__lte=orders[1999].pk))
+        large = peak_memory(Order.objects.all())
+        # Ten times the rows, but memory stays within the same chunk budget.
+        self.assertLess(large, small * 2)
+
+
+class CartAdminChangelistTests(TestCase):
+    """Test the cart app changelists stay at a fixed query count at 100k rows."""
+
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Account.objects.create_superuser(
+            username="admin", email="[email protected]", password="testpass123"
+        )
+        collection = Collection.objects.create(name="Default")
+        product = Product.objects.create(
+            name="Mug", price_in_cents=1500, collection=collection
+        )
+        orders = Order.objects.bulk_create(
+            Order(account=cls.admin, total_cents=1500, payment_id=f"pi_{i}")
+            for i in range(cls.ROWS)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=1, unit_price_cents=1500)
+            for order in orders
+        )
+        # An account has at most one cart.
+        accounts = Account.objects.bulk_create(
+            Account(username=f"user{i}", email=f"user{i}@example.com")
+            for i in range(cls.ROWS)
+        )
+        carts = Cart.objects.bulk_create(Cart(account=account) for account in accounts)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=1) for cart in carts
+        )
+        WebhookEvent.objects.bulk_create(
+            WebhookEvent(event_id=f"evt_{i}", event_type="test", payload={})
+            for i in range(cls.ROWS)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueries(self, model, num, params=None):
+        url = reverse(f"admin:cart_{model}_changelist")
+        # Warm the per-request caches shared with the storefront.
+        self.client.get(url, params)
+        # Session, user, row count and the page itself.
+        with self.assertNumQueries(num):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+    def test_order_changelist(self):
+        self.assertChangelistQueries("order", 4)
+
+    def test_order_changelist_filtered_by_status_and_date(self):
+        self.assertChangelistQueries(
+            "order",
+            4,
+            {
+                "status__exact": "pending",
+                "created_at__gte": "2020-01-01 00:00:00+00:00",
+            },
+        )
+
+    def test_order_changelist_search(self):
+        # Plus one indexed account lookup per searched account field.
+        self.assertChangelistQueries("order", 6, {"q": "pi_5"})
+
+    def test_searches_use_the_indexes(self):
+        request = RequestFactory().get("/")
+        for model, term, found in [
+            (Order, "pi_5", 1),
+            (Order, self.admin.username, self.ROWS),
+            (OrderItem, "pi_5", 1),
+            (Cart, "user5", 1),
+            (Cart, "user5@example.com", 1),
+            (CartItem, "user5", 1),
+            (WebhookEvent, "evt_5", 1),
+        ]:
+            with self.subTest(model=model.__name__, term=term):
+                queryset, _ = admin.site._registry[model].get_search_results(
+                    request, model.objects.all(), term
+                )
+                self.assertEqual(queryset.count(), found)
+                self.assertNotIn("SCAN", queryset.explain())
+
+    def test_orderitem_changelist(self):
+        self.assertChangelistQueries("orderitem", 4)
+
+    def test_cart_changelist(self):
+        self.assertChangelistQueries("cart", 4)
+
+    def test_cartitem_changelist(self):
+        self.assertChangelistQueries("cartitem", 4)
+
+    def test_webhookevent_changelist(self):
+        self.assertChangelistQueries("webhookevent", 4)
+
+
+class SessionCartTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the anonymous cookie cart."""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.update(image="products/test.jpg")
+        cache.clear()
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            reverse("cart:add_to_cart", args=[product.id]), {"quantity": quantity}
+        )
+
+    def test_anonymous_add_does_not_write_to_the_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add(self.product1, 2)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [q for q in queries.captured_queries if not q["sql"].startswith("SELECT")]
+        )
+        self.assertIn(COOKIE_NAME, response.cookies)
+        self.assertFalse(Cart.objects.exclude(pk=self.cart.pk).exists())
+
+    def test_anonymous_cart_is_kept_between_requests(self):
+        self.add(self.product1, 2)
+        self.add(self.product1, 1)
+        self.add(self.product2)
+        response = self.client.get(reverse("cart:cart"))
+        self.assertEqual(response.context["cart_count"], 4)
+        self.assertEqual(
+            [(i.product, i.quantity) for i in response.context["cart_items"]],
+            [(self.product1, 3), (self.product2, 1)],
+        )
+        self.assertEqual(response.context["subtotal_dollars"], 70)
+
+    def test_anonymous_pages_link_to_the_cart(self):
+        self.add(self.product1, 2)
+        response = self.client.get(reverse("about"))
+        self.assertContains(response, f'href="{reverse("cart:cart")}"')
+        self.assertInHTML(
+            '<span id="cart-badge" class="absolute -top-1.5 -right-1.5 min-w-5 h-5 '
+            "px-1 rounded-full bg-amber-600 text-white text-xs font-semibold flex "
+            'items-center justify-center">2</span>',
+            response.content.decode(),
+        )
+
+    def test_anonymous_update_and_remove(self):
+        self.add(self.product1, 2)
+        self.add(self.product2)
+        self.client.post(
+            reverse("cart:update_cart", args=[self.product1.id]), {"quantity": 5}
+        )
+        self.client.post(reverse("cart:remove_from_cart", args=[self.product2.id]))
+        cart = get_cart(self.client.get(reverse("cart:cart")).wsgi_request)
+        self.assertEqual(cart.quantities, {self.product1.pk: 5})
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies[COOKIE_NAME] = '{"1": 100}'
+        response = self.client.get(reverse("cart:cart"))
+        self.assertEqual(response.context["cart_count"], 0)
+
+    def test_both_carts_share_an_interface(self):
+        session_cart = SessionCart()
+        for cart in (session_cart, self.cart):
+            cart.add(self.product1, quantity=2)
+            cart.add(self.product2)
+            cart.add(self.product2, quantity=3, replace=True)
+            cart.remove(self.product1)
+            self.assertEqual(cart.count(), 3)
+            self.assertEqual(cart.subtotal_cents(), 7500)
+
+    def test_login_merges_the_anonymous_cart_in_one_upsert(self):
+        self.cart.add(self.product1, quantity=1)
+        self.add(self.product1, 2)
+        self.add(self.product2)
+
+        response = self.client.post(
+            reverse("account:login_submit"),
+            {"username": "juan", "password": "testpass123"},
+        )
+        self.assertEqual(response.cookies[COOKIE_NAME].value, "")
+        self.assertEqual(
+            dict(self.cart.items().values_list("product__name", "quantity")),
+            {"Mug": 3, "Plate": 1},
+        )
+
+    def test_merge_queries(self):
+        self.cart.add(self.product1, quantity=1)
+        # Existing lines, live products and the upsert.
+        with self.assertNumQueries(3):
+            self.cart.merge({self.product1.pk: 2, self.product2.pk: 1, 999: 1})
+        self.assertEqual(self.cart.count(), 4)
+
+
+class CartBatchUpdateTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test updating every cart line at once."""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.update(image="products/test.jpg")
+        self.product3 = Product.objects.create(
+            name="Bowl",
+            price_in_cents=2000,
+            quantity=10,
+            image="products/test.jpg",
+            collection=self.collection,
+        )
+        for product in (self.product1, self.product2, self.product3):
+            self.cart.add(product, quantity=1)
+        self.url = reverse("cart:update_cart_lines")
+
+    def quantities(self, cart):
+        return {item.product.name: item.quantity for item in cart.summary().items}
+
+    def test_set_quantities_updates_and_removes_lines_in_bulk(self):
+        # Savepoint, lines with their stock, bulk_update, delete, release.
+        with self.assertNumQueries(5):
+            self.cart.set_quantities(
+                {self.product1.pk: 4, self.product2.pk: 0, self.product3.pk: 1}
+            )
+        self.assertEqual(self.quantities(self.cart), {"Mug": 4, "Bowl": 1})
+
+    def test_quantity_above_stock_changes_nothing(self):
+        with self.assertRaises(OutOfStock):
+            self.cart.set_quantities({self.product1.pk: 4, self.product2.pk: 11})
+        self.assertEqual(self.quantities(self.cart), {"Mug": 1, "Plate": 1, "Bowl": 1})
+
+    def test_cart_page_submits_one_form(self):
+        self.client.force_login(self.account)
+        response = self.client.get(reverse("cart:cart"))
+        self.assertContains(response, 'id="cart-lines"', count=1)
+        self.assertContains(response, f'name="quantity-{self.product2.id}"')
+
+        response = self.client.post(
+            self.url,
+            {
+                f"quantity-{self.product1.id}": "3",
+                f"quantity-{self.product2.id}": "0",
+                f"quantity-{self.product3.id}": "2",
+            },
+        )
+        self.assertRedirects(
+            response, reverse("cart:cart"), fetch_redirect_response=False
+        )
+        self.assertEqual(self.quantities(self.cart), {"Mug": 3, "Bowl": 2})
+        self.assertEqual(cart_count.peek(self.account.pk), None)
+
+    def test_over_stock_post_shows_a_warning(self):
+        self.client.force_login(self.account)
+        response = self.client.post(
+            self.url, {f"quantity-{self.product1.id}": "50"}, follow=True
+        )
+        self.assertContains(response, "Not enough stock left for: Mug.")
+
+    def test_anonymous_cart_batch_update(self):
+        self.client.post(reverse("cart:add_to_cart", args=[self.product1.id]))
+        self.client.post(reverse("cart:add_to_cart", args=[self.product2.id]))
+        self.client.post(
+            self.url,
+            {
+                f"quantity-{self.product1.id}": "5",
+                f"quantity-{self.product2.id}": "0",
+                f"quantity-{self.product3.id}": "1",
+            },
+        )
+        cart = get_cart(self.client.get(reverse("cart:cart")).wsgi_request)
+        self.assertEqual(cart.quantities, {self.product1.pk: 5})
+
+
+class CartFragmentTests(BaseCartSetupMixin, TestCase):
+    """Takes setup from BaseCartSetup and Test the htmx and JSON cart responses."""
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.update(image="products/test.jpg")
+        cache.clear()
+        self.client.force_login(self.account)
+        self.add_url = reverse("cart:add_to_cart", args=[self.product1.id])
+
+    def test_htmx_add_returns_the_badge_and_message(self):
+        response = self.client.post(
+            self.add_url, {"quantity": 2}, headers={"HX-Request": "true"}
+        )
+        self.assertNotContains(response, "<html")
+        # Added from the product page, which has no cart table to update.
+        self.assertNotContains(response, "cart-line-")
+        self.assertNotContains(response, "cart-subtotal")
+        self.assertContains(response, "Added Mug (x2) to cart.")
+        self.assertContains(response, 'id="cart-badge"')
+        # The message is already in the fragment, so it is not queued.
+        page = self.client.get(reverse("cart:cart"))
+        self.assertEqual(list(page.context["messages"]), [])
+
+    def test_json_add_returns_the_changed_state(self):
+        self.cart.add(self.product2)
+        response = self.client.post(
+            self.add_url, {"quantity": 2}, headers={"Accept": "application/json"}
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "message": "Added Mug (x2) to cart.",
+                "product_id": self.product1.id,
+                "quantity": 2,
+                "line_cents": 3000,
+                "subtotal_cents": 5500,
+                "cart_count": 3,
+            },
+        )
+
+    def test_htmx_remove_drops_the_line(self):
+        self.cart.add(self.product1)
+        response = self.client.post(
+            reverse("cart:remove_from_cart", args=[self.product1.id]),
+            headers={"HX-Request": "true"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "cart-line-")
+        self.assertContains(response, '<span id="cart-subtotal" hx-swap-oob="true">0')
+
+    def test_htmx_update_sets_the_quantity(self):
+        self.cart.add(self.product1)
+        response = self.client.post(
+            reverse("cart:update_cart", args=[self.product1.id]),
+            {"quantity": 4},
+            headers={"HX-Request": "true"},
+        )
+        self.assertContains(response, "Updated Mug (x4) to cart.")
+        self.assertContains(response, '<span id="cart-subtotal" hx-swap-oob="true">60')
+        self.assertEqual(self.cart.items().get().quantity, 4)
+
+    def test_forms_post_through_htmx(self):
+        self.cart.add(self.product1)
+        product_page = self.client.get(reverse("shop:product", args=[self.product1.id]))
+        self.assertContains(product_page, "js/htmx.min.js")
+        self.assertContains(product_page, f'hx-post="{self.add_url}"')
+        remove_url = reverse("cart:remove_from_cart", args=[self.product1.id])
+        cart_page = self.client.get(reverse("cart:cart"))
+        self.assertContains(cart_page, f'hx-post="{remove_url}"')
+        self.assertContains(cart_page, f'hx-target="#cart-line-{self.product1.id}"')
+        self.assertContains(cart_page, f'id="cart-line-{self.product1.id}"')
+
+    def test_pages_have_the_flash_target(self):
+        response = self.client.get(reverse("cart:cart"))
+        self.assertContains(response, 'id="flash"', count=1)
+        self.assertNotContains(response, 'hx-swap-oob="true"')
+
+    def test_browsers_still_get_the_full_page(self):
+        response = self.client.post(
+            self.add_url,
+            headers={"Accept": "text/html,application/xhtml+xml,*/*;q=0.8"},
+        )
+        self.assertContains(response, "<html")
+
+    def test_fragment_skips_the_page_queries(self):
+        self.client.post(self.add_url, headers={"HX-Request": "true"})
+        # Session, user, product, cart, the F update, the line and totals.
+        with self.assertNumQueries(7):
+            self.client.post(self.add_url, headers={"HX-Request": "true"})
+
+
+class LazyRequestCartTests(BaseCartSetupMixin, TestCase):
+    """Test the lazy request.cart shared by views and context processors."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.other = Account.objects.create_user(
+            username="ana", email="[email protected]", password="testpass123"
+        )
+        self.client.force_login(self.other)
+
+    def test_viewing_an_empty_cart_creates_no_row(self):
+        response = self.client.get(reverse("cart:cart"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Cart.objects.filter(account=self.other).exists())
+
+    def test_first_add_creates_the_cart(self):
+        self.client.post(reverse("cart:add_to_cart", args=[self.product1.id]))
+        cart = Cart.objects.get(account=self.other)
+        self.assertEqual(cart.items().get().product, self.product1)
+
+    def test_concurrent_first_writes_share_one_cart(self):
+        first, second = Cart.for_account(self.other), Cart.for_account(self.other)
+        first.add(self.product1)
+        second.add(self.product2)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(
+            set(Cart.objects.get(account=self.other).products.all()),
+            {self.product1, self.product2},
+        )
+
+    def test_checkout_of_a_missing_cart_creates_nothing(self):
+        Account.objects.filter(pk=self.other.pk).update(
+            billing_address_line1="Calle 1",
+            billing_city="Madrid",
+            billing_postal_code="28001",
+            billing_country="ES",
+            shipping_address_line1="Calle 1",
+            shipping_city="Madrid",
+            shipping_postal_code="28001",
+            shipping_country="ES",
+        )
+        response = self.client.post(reverse("cart:create_checkout_session"))
+        self.assertRedirects(response, reverse("cart:cart"))
+        self.assertFalse(Cart.objects.filter(account=self.other).exists())
+
+    def test_cart_is_fetched_once_per_request(self):
+        Product.objects.update(image="products/test.jpg")
+        self.client.force_login(self.account)
+        self.cart.add(self.product1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("cart:cart"))
+        cart_lookups = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith('SELECT "cart_cart"')
+        ]
+        self.assertEqual(len(cart_lookups), 1)
+
+    def test_untouched_cart_runs_no_query(self):
+        request = RequestFactory().get("/")
+        request.user = self.other
+        with self.assertNumQueries(0):
+            CartMiddleware(lambda request: None)(request)
@@ -6,6 +6,7 @@ app_name = "cart"
 urlpatterns = [
     path("", views.cart, name="cart"),
     path("add/<int:product_id>", views.add_to_cart, name="add_to_cart"),
+    path("update/", views.update_cart_lines, name="update_cart_lines"),
     path("update/<int:product_id>", views.update_cart, name="update_cart"),
     path("remove/<int:product_id>", views.remove_from_cart, name="remove_from_cart"),
     path("clear/", views.clear_cart, name="clear_cart"),
@@ -1,80 +1,106 @@
+from django.core.cache import cache
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_POST
-from .models import Order, Cart
-from .helpers import parse_quantity, get_cart
+from .models import Order, OutOfStock
+from .fragments import cart_fragment, wants_fragment
+from .helpers import parse_quantity, parse_quantities, get_cart_summary
 from shop.models import Product
 from .validation import has_complete_addresses
 from django.contrib.auth.decorators import login_required
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import get_language, gettext_lazy as _
 from django.contrib import messages
 
 
-@login_required
 def cart(request):
     """Display Cart."""
-    cart = get_cart(request)
+    summary = get_cart_summary(request)
     context = {
-        "cart": cart,
-        "cart_items": cart.items(),
-        "subtotal_dollars": cart.subtotal_dollars(),
+        "cart": summary.cart,
+        "cart_items": summary.items,
+        "subtotal_dollars": summary.subtotal_dollars,
     }
     return render(request, "cart/cart.html", context)
 
 
-@login_required
 @require_POST
 def add_to_cart(request, product_id):
     """To add a product to Cart."""
-    cart = get_cart(request)
+    cart = request.cart
     product = get_object_or_404(Product, pk=product_id)
     qty = parse_quantity(request)
     cart.add(product, quantity=qty)
-    messages.success(request, _(f"Added {product.name} (x{qty}) to cart."))
+    message = _(f"Added {product.name} (x{qty}) to cart.")
+    if wants_fragment(request):
+        # Posted from the product page, which has no cart line to swap.
+        return cart_fragment(request, product, message, "cart/partials/cart_added.html")
+    messages.success(request, message)
     context = {"product": product}
     return render(request, "shop/product.html", context)
 
 
-@login_required
 @require_POST
 def update_cart(request, product_id):
     """To add a product to Cart."""
-    cart = get_cart(request)
+    cart = request.cart
     product = get_object_or_404(Product, pk=product_id)
     qty = parse_quantity(request)
     cart.add(product, quantity=qty, replace=True)
-    messages.success(request, _(f"Updated {product.name} (x{qty}) to cart."))
+    message = _(f"Updated {product.name} (x{qty}) to cart.")
+    if wants_fragment(request):
+        return cart_fragment(request, product, message)
+    messages.success(request, message)
+    return redirect("cart:cart")
+
+
+@require_POST
+def update_cart_lines(request):
+    """Update the quantities of every cart line from one form."""
+    quantities = parse_quantities(request)
+    try:
+        request.cart.set_quantities(quantities)
+    except OutOfStock as exc:
+        messages.warning(
+            request,
+            _("Not enough stock left for: %(products)s.") % {"products": exc},
+        )
+    else:
+        messages.success(request, _("Cart updated."))
     return redirect("cart:cart")
 
 
-@login_required
 @require_POST
 def remove_from_cart(request, product_id):
     """To add a product to Cart."""
-    cart = get_cart(request)
+    cart = request.cart
     product = get_object_or_404(Product, pk=product_id)
     cart.remove(product)
-    messages.success(request, _(f"Removed {product.name} from cart."))
+    message = _(f"Removed {product.name} from cart.")
+    if wants_fragment(request):
+        return cart_fragment(request, product, message)
+    messages.success(request, message)
     return redirect("cart:cart")
 
 
-@login_required
 @require_POST
 def clear_cart(request):
     """To add a product to Cart."""
-    cart = get_cart(request)
+    cart = request.cart
     cart.clear()
     messages.success(request, _("Cart Cleared."))
     return redirect("cart:cart")
 
 
-@login_required
+@login_required(login_url="account:login")
 def checkout(request):
     """Display checkout page with cart summary."""
-    cart = get_cart(request)
+    summary = get_cart_summary(request)
     context = {
-        "cart_items": list(cart.items()),
-        "subtotal_cents": cart.subtotal_cents(),
-        "cart_count": cart.count(),
+        "cart_items": summary.items,
+        "subtotal_cents": summary.subtotal_cents,
+        "subtotal_dollars": summary.subtotal_dollars,
+        "cart_count": summary.quantity,
     }
     return render(request, "cart/checkout.html", context)
 
@@ -84,7 +110,7 @@ def update_cart_checkout(request, product_id):
     """Update a product's quantity during checkout."""
     product = get_object_or_404(Product, pk=product_id)
     qty = parse_quantity(request)
-    cart = get_cart(request)
+    cart = request.cart
     cart.add(product, quantity=qty, replace=True)
     messages.success(request, f"Updated {product.name} to x{qty}.")
     return redirect("cart:checkout")
@@ -94,18 +120,18 @@ def update_cart_checkout(request, product_id):
 def remove_from_cart_checkout(request, product_id):
     """Remove a product from the cart during checkout."""
     product = get_object_or_404(Product, pk=product_id)
-    cart = get_cart(request)
+    cart = request.cart
     cart.remove(product)
     messages.info(request, f"Removed {product.name} from cart.")
     return redirect("cart:checkout")
 
 
-@login_required
+@login_required(login_url="account:login")
 @require_POST
 def create_checkout_session(request):
     """Create Stripe Checkout session from cart and redirect to Stripe."""
     account = request.user
-    cart = get_object_or_404(Cart, account=account)
+    cart = request.cart
 
     if not has_complete_addresses(account):
         messages.warning(
@@ -114,7 +140,14 @@ def create_checkout_session(request):
         )
         return redirect("account:account")
 
-    session, order = Order.create_from_cart(request, cart, account)
+    try:
+        session, order = Order.create_from_cart(request, cart, account)
+    except OutOfStock as exc:
+        messages.warning(
+            request,
+            _("Not enough stock left for: %(products)s.") % {"products": exc},
+        )
+        return redirect("cart:cart")
 
     if not session:
         messages.warning(request, _("Your cart is empty."))
@@ -126,21 +159,51 @@ def create_checkout_session(request):
 def success(request):
     """Handle succesful Stripe Payments."""
     session_id = request.GET.get("session_id")
-    cart = get_cart(request)
+    cart = request.cart
     cart.clear()
     messages.success(request, _("Payment successful! Your order has been placed."))
     return render(request, "cart/success.html", {"session_id": session_id})
 
 
 def cancel(request):
-    """Handle cancelled Stripe Checkout Sessions."""
+    """Handle a cancelled Stripe Checkout Session and release its stock.
+
+    Only the order named in the cancel_url is released, so other checkouts
+    of the account stay open.
+    """
+    order_id = request.GET.get("order", "")
+    if request.user.is_authenticated and order_id.isdigit():
+        with transaction.atomic():
+            Order.release_pending(request.user, int(order_id))
     return render(request, "cart/cancel.html")
 
 
 @login_required
 def order_details(request, order_id):
-    """Display Order Details."""
-    order = get_object_or_404(Order, pk=order_id)
+    """Display Order Details of an order placed by the current account.
+
+    Paid orders never change, so their rendered details are cached for
+    good per language. The key holds the account and the status, and the
+    ownership lookup always runs first, so the cache can neither serve an
+    order to another account nor outlive a status change.
+    """
+    status = get_object_or_404(
+        Order.objects.values_list("status", flat=True),
+        pk=order_id,
+        account=request.user,
+    )
+    key = f"order_details:{order_id}:{request.user.pk}:{status}:{get_language()}"
+    fragment = cache.get(key) if status == Order.STATUS_PAID else None
+
+    if fragment is None:
+        order = Order.objects.prefetch_related("items__product__collection").get(
+            pk=order_id
+        )
+        fragment = render_to_string(
+            "cart/order_details_fragment.html", {"order": order}, request
+        )
+        if order.status == Order.STATUS_PAID:
+            cache.set(key, fragment, timeout=None)
 
-    context = {"order": order}
+    context = {"order_fragment": fragment}
     return render(request, "cart/order_details.html", context)
@@ -1,36 +1,49 @@
+import json
 import os
 import stripe
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponse
-from .models import Order
+from .inbox import enqueue
+from .models import Order, StockReservation
 
 
 @csrf_exempt
 def stripe_webhook(request):
-    """Handle Stripe events."""
+    """Verify a Stripe event and queue it for the process_webhooks worker."""
     payload = request.body
     sig_header = request.META.get("HTTP_STRIPE_SIGNATURE")
 
     try:
-        event = stripe.Webhook.construct_event(
+        stripe.Webhook.construct_event(
             payload, sig_header, os.environ["STRIPE_WEBHOOK_SECRET"]
         )
     except (ValueError, stripe.error.SignatureVerificationError):
         return HttpResponse(status=400)
 
+    enqueue(json.loads(payload))
+    return HttpResponse(status=200)
+
+
+@transaction.atomic
+def handle_event(event):
+    """Handle a Stripe event taken from the webhook inbox."""
     if (
         event["type"] == "checkout.session.completed"
         or event["type"] == "checkout.session.async_payment_succeeded"
     ):
         stripe_session = event["data"]["object"]
-        order_id = stripe_session["client_reference_id"]
-        try:
-            order = Order.objects.get(id=order_id)
-        except Order.DoesNotExist:
-            return HttpResponse(status=404)
+        order = (
+            Order.objects.select_related("account")
+            .select_for_update(of=("self",))
+            .get(id=stripe_session["client_reference_id"])
+        )
+
+        if order.status == Order.STATUS_PAID:
+            return
 
         if not order.account:
-            return HttpResponse(status=400)
+            raise ValueError(f"Order {order.id} has no account.")
 
         account = order.account
         order.fulfill(
@@ -50,7 +63,13 @@ def stripe_webhook(request):
             shipping_country=account.shipping_country,
         )
 
-        order.set_status("paid")
+    elif event["type"] == "checkout.session.expired":
+        stripe_session = event["data"]["object"]
+        order_id = stripe_session["client_reference_id"]
+        Order.objects.filter(id=order_id, status=Order.STATUS_PENDING).update(
+            status=Order.STATUS_CANCELLED
+        )
+        StockReservation.objects.filter(order_id=order_id).delete()
 
     elif event["type"] in ("payment_intent.payment_failed", "payment_intent.canceled"):
         payment_intent = event["data"]["object"]
@@ -59,8 +78,6 @@ def stripe_webhook(request):
         try:
             order = Order.objects.get(payment_id=pi_id)
         except Order.DoesNotExist:
-            return HttpResponse(status=200)
+            return
 
         order.set_status("cancelled")
-
-    return HttpResponse(status=200)
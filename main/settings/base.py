@@ -50,6 +50,8 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "cart.middleware.CartMiddleware",
+    "account.middleware.WishlistMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -66,6 +68,8 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "shop.context_processors.collections_processor",
+                "cart.context_processors.cart_info",
+                "account.context_processors.wishlist_info",
             ],
         },
     },
@@ -78,6 +82,12 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": "PRAGMA journal_mode=WAL;",
+            "transaction_mode": "IMMEDIATE",
+            "timeout": 20,
+        },
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -87,6 +97,32 @@ if os.getenv("DATABASE_URL"):
         os.getenv("DATABASE_URL"), conn_max_age=600
     )
 
+# Cache
+# Local memory is per process: invalidation and counters only reach the
+# process that made the change, so deployments set REDIS_URL.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# Share the cache between every worker and management command if present.
+# Size the instance with maxmemory and the allkeys-lru policy: every key is
+# rebuilt from the database when evicted.
+if os.getenv("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL"),
+    }
+
+COLLECTIONS_CACHE_TIMEOUT = 60 * 15
+
+# Shop
+SHOP_PAGE_SIZE = 12
+ACCOUNT_ORDERS_PAGE_SIZE = 10
+# Seconds an anonymous visitor's cart cookie is kept.
+CART_COOKIE_AGE = 60 * 60 * 24 * 30
+
 # Password validators
 AUTH_PASSWORD_VALIDATORS = [
     {
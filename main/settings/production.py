@@ -1,7 +1,9 @@
 from .base import *
 import os
 
-DEBUG = True
+# Hashed static file names, and WhiteNoise's far-future cache headers for
+# them, are only used when DEBUG is off.
+DEBUG = os.getenv("DJANGO_DEBUG") == "True"
 
 # Storage
 DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
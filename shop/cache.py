@@ -0,0 +1,63 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import get_language
+from .models import Collection
+
+VERSION_KEY = "shop:collections:version"
+HITS_KEY = "shop:collections:hits"
+MISSES_KEY = "shop:collections:misses"
+
+
+def _increment(key):
+    """Increment a counter in the cache, creating it on first use."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _version():
+    """Return the current version of the cached collection list.
+
+    A missing version is seeded from the clock so an evicted key can never
+    fall back onto an older, still cached entry.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_collections():
+    """Return every Collection, served from the cache when it is warm."""
+    key = f"shop:collections:v{_version()}:{get_language()}"
+    collections = cache.get(key)
+    if collections is not None:
+        _increment(HITS_KEY)
+        return collections
+
+    _increment(MISSES_KEY)
+    collections = list(Collection.objects.all())
+    timeout = getattr(settings, "COLLECTIONS_CACHE_TIMEOUT", 60 * 15)
+    cache.set(key, collections, timeout=timeout)
+    return collections
+
+
+def invalidate_collections():
+    """Bump the version so every language entry is rebuilt on next access."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        _version()
+
+
+def collections_cache_stats():
+    """Return the hit and miss counters of the collection cache."""
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counters.get(HITS_KEY, 0),
+        "misses": counters.get(MISSES_KEY, 0),
+    }
@@ -1,6 +1,6 @@
-from .models import Collection
+from .cache import get_collections
 
 
 def collections_processor(request):
-    collections = Collection.objects.all()
+    collections = get_collections()
     return {"collections": collections}
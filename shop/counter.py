@@ -0,0 +1,43 @@
+from django.core.cache import cache
+
+
+class KeyedCounter:
+    """A per-account count kept in the cache and rebuilt from the database.
+
+    prefix namespaces the cache keys and compute(account_id) counts from the
+    database whenever the cached value is missing.
+    """
+
+    def __init__(self, prefix, compute):
+        self.prefix = prefix
+        self.compute = compute
+
+    def key(self, account_id):
+        return f"{self.prefix}:{account_id}"
+
+    def peek(self, account_id):
+        """Return the cached count, or None on a miss."""
+        return cache.get(self.key(account_id))
+
+    def get(self, account_id):
+        """Return the cached count, computing and storing it on a miss."""
+        count = self.peek(account_id)
+        if count is None:
+            count = self.compute(account_id)
+            self.set(account_id, count)
+        return count
+
+    def set(self, account_id, count):
+        """Store the count of an account."""
+        cache.set(self.key(account_id), count)
+
+    def incr(self, account_id, delta):
+        """Add delta to a cached count, leaving a missing count to be rebuilt."""
+        try:
+            cache.incr(self.key(account_id), delta)
+        except ValueError:
+            pass
+
+    def forget(self, account_id):
+        """Drop a cached count so it is rebuilt from the database on next read."""
+        cache.delete(self.key(account_id))
@@ -0,0 +1,126 @@
+import io
+import os
+from django.core.files.base import ContentFile
+from django.db.models import CharField, F, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+# Widths a derivative is generated at, never wider than the original.
+WIDTHS = (320, 640, 960, 1280, 1920)
+
+# Formats in the order browsers should prefer them, with their Pillow
+# format name, mime type and encoder options.
+FORMATS = {
+    "avif": ("AVIF", "image/avif", {"quality": 50}),
+    "webp": ("WEBP", "image/webp", {"quality": 75, "method": 4}),
+    "jpeg": (
+        "JPEG",
+        "image/jpeg",
+        {"quality": 80, "optimize": True, "progressive": True},
+    ),
+}
+
+
+def available_formats():
+    """Return the derivative formats the installed Pillow can encode."""
+    return [fmt for fmt in FORMATS if fmt == "jpeg" or features.check(fmt)]
+
+
+def derivative_name(name, width, fmt):
+    """Return the storage name of a derivative, next to its original."""
+    root, _ = os.path.splitext(name)
+    return f"{root}.{width}w.{fmt}"
+
+
+def _widths_for(original_width):
+    """Return the widths to generate for an original of the given width."""
+    widths = [width for width in WIDTHS if width < original_width]
+    if original_width <= WIDTHS[-1]:
+        widths.append(original_width)
+    return widths
+
+
+def _encode(image, fmt):
+    """Encode image in fmt and return its bytes."""
+    pil_format, _, options = FORMATS[fmt]
+    if fmt == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build_derivatives(storage, name):
+    """Generate the width-stepped derivatives of the image stored as name.
+
+    Every derivative is written through storage and the result describes
+    them for the responsive_image tag: the source name they were made
+    from, the original size and, per format, the stored name of each
+    width. Returns None when the original is not an image. A missing or
+    unreadable original raises OSError, so the image stays stale and is
+    retried.
+    """
+    with storage.open(name) as original:
+        try:
+            image = Image.open(original)
+        except UnidentifiedImageError:
+            return None
+        image.load()
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    original_width, original_height = image.size
+    derivatives = {fmt: {} for fmt in available_formats()}
+    for width in _widths_for(original_width):
+        height = max(1, round(original_height * width / original_width))
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in derivatives:
+            stored = storage.save(
+                derivative_name(name, width, fmt),
+                ContentFile(_encode(resized, fmt)),
+            )
+            derivatives[fmt][str(width)] = stored
+
+    return {
+        "source": name,
+        "width": original_width,
+        "height": original_height,
+        "formats": derivatives,
+    }
+
+
+def is_current(instance):
+    """Return True if the derivatives of instance match its current image."""
+    return instance.image_derivatives.get("source", "") == instance.image.name
+
+
+def stale(queryset):
+    """Filter queryset down to the images whose derivatives are out of date."""
+    return (
+        queryset.exclude(image="")
+        .alias(
+            source=Coalesce(
+                KT("image_derivatives__source"), Value(""), output_field=CharField()
+            )
+        )
+        .exclude(source=F("image"))
+    )
+
+
+def save_derivatives(instance, derivatives):
+    """Record new derivatives on a Product or Collection.
+
+    Only the image_derivatives column is written, so concurrent edits to
+    other fields are kept. A file that is not an image is still recorded
+    as processed, with no formats, so it is not retried on every backfill.
+    The superseded derivatives are left in storage, like the originals
+    they were made from: paid order details are cached for good and keep
+    pointing at them.
+    """
+    if derivatives is None:
+        derivatives = {"source": instance.image.name, "formats": {}}
+    type(instance).objects.filter(pk=instance.pk).update(image_derivatives=derivatives)
+    instance.image_derivatives = derivatives
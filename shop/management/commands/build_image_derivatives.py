@@ -0,0 +1,98 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from shop.cache import invalidate_collections
+from shop.images import build_derivatives, save_derivatives, stale
+from shop.models import Collection, Product
+
+logger = logging.getLogger(__name__)
+
+
+def _build(label, name):
+    """Build the derivatives of one image, run inside a pool worker."""
+    storage = apps.get_model(label)._meta.get_field("image").storage
+    return build_derivatives(storage, name)
+
+
+def _results(pending, workers):
+    """Yield each pending object with its derivatives, or the error raised.
+
+    Results are yielded as soon as each image is built, so they can be
+    saved before the rest of the backfill runs.
+    """
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+            futures = {
+                pool.submit(_build, obj._meta.label, obj.image.name): obj
+                for obj in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as exc:
+                    yield futures[future], exc
+    else:
+        for obj in pending:
+            try:
+                yield obj, _build(obj._meta.label, obj.image.name)
+            except Exception as exc:
+                yield obj, exc
+
+
+class Command(BaseCommand):
+    help = "Build the responsive image derivatives of new and replaced images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes resizing images in parallel, 1 to run inline.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild images whose derivatives are already up to date.",
+        )
+
+    def handle(self, *args, workers, force, **options):
+        querysets = [model.objects.exclude(image="") for model in (Collection, Product)]
+        if not force:
+            querysets = [stale(queryset) for queryset in querysets]
+        pending = [
+            obj
+            for queryset in querysets
+            for obj in queryset.only("image", "image_derivatives").iterator()
+        ]
+
+        built = not_images = failed = 0
+        for obj, derivatives in _results(pending, workers):
+            # A storage or encoder error, including a missing original,
+            # skips the image, which stays stale and is picked up again by
+            # the next run.
+            if isinstance(derivatives, Exception):
+                logger.error(
+                    "Could not build image derivatives for %s %s",
+                    type(obj).__name__,
+                    obj.pk,
+                    exc_info=derivatives,
+                )
+                failed += 1
+                continue
+            save_derivatives(obj, derivatives)
+            if derivatives is None:
+                not_images += 1
+            else:
+                built += 1
+            if isinstance(obj, Collection):
+                invalidate_collections()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built derivatives for {built} images, "
+                f"{not_images} not images, {failed} failed."
+            )
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0002_alter_collection_image_alter_product_image"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["collection", "created_date"],
+                name="product_collection_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0003_product_collection_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="collection",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="image_derivatives",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
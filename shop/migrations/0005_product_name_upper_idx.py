@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:12
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shop", "0004_image_derivatives"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                django.db.models.functions.text.Upper("name"),
+                name="product_name_upper_idx",
+            ),
+        ),
+    ]
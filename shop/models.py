@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 import datetime
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -12,6 +13,7 @@ class Collection(models.Model):
     name = models.CharField(_("name"), max_length=100)
     description = models.TextField(_("description"))
     image = models.ImageField(_("image"), upload_to="collections/")
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     ceramic_type = models.CharField(_("ceramic type"), max_length=100)
 
     def __str__(self):
@@ -25,6 +27,7 @@ class Product(models.Model):
     description = models.TextField(_("description"))
     quantity = models.IntegerField(_("quantity"), default=0)
     image = models.ImageField(_("image"), upload_to="products/")
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     price_in_cents = models.IntegerField(_("price"), default=0)
     created_date = models.DateTimeField(default=timezone.now)
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE)
@@ -66,10 +69,21 @@ class Product(models.Model):
         """To discount from the inventory of the product."""
         if quantity <= 0:
             raise ValidationError("Quantity must be positive.")
-        if self.quantity >= quantity:
-            self.quantity -= quantity
-            self.save(update_fields=["quantity"])
-        else:
+        updated = Product.objects.filter(pk=self.pk, quantity__gte=quantity).update(
+            quantity=models.F("quantity") - quantity
+        )
+        if not updated:
             raise ValidationError(
                 "Not enough quantity available to complete this operation."
             )
+        self.refresh_from_db(fields=["quantity"])
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["collection", "created_date"],
+                name="product_collection_created_idx",
+            ),
+            # Serves the exact, case-insensitive name search of the admin.
+            models.Index(Upper("name"), name="product_name_upper_idx"),
+        ]
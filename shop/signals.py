@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate_collections
+from .models import Collection
+
+
+@receiver(post_save, sender=Collection)
+@receiver(post_delete, sender=Collection)
+def collection_changed(sender, **kwargs):
+    """Invalidate the cached collection list once the change is committed."""
+    transaction.on_commit(invalidate_collections)
@@ -0,0 +1,52 @@
+from django import template
+from django.core.files.storage import default_storage
+from ..images import FORMATS, is_current
+
+register = template.Library()
+
+
+def _srcset(names, storage):
+    """Return the srcset of one format, narrowest candidate first."""
+    return ", ".join(
+        f"{storage.url(name)} {width}w"
+        for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.inclusion_tag("shop/partials/responsive_image.html")
+def responsive_image(obj, sizes="100vw", alt="", css_class="", loading="lazy"):
+    """Render the image of a Product or Collection as a responsive <picture>.
+
+    sizes tells the browser how wide the image is laid out, so it can pick
+    the smallest derivative that covers it. Images without derivatives,
+    or whose derivatives were made from a replaced image and are not yet
+    rebuilt, fall back to a plain <img> of the original.
+    """
+    image = obj.image
+    derivatives = obj.image_derivatives if is_current(obj) else {}
+    formats = derivatives.get("formats") or {}
+    storage = image.storage if image else default_storage
+    sources = [
+        {"type": FORMATS[fmt][1], "srcset": _srcset(formats[fmt], storage)}
+        for fmt in FORMATS
+        if fmt != "jpeg" and formats.get(fmt)
+    ]
+    fallback = formats.get("jpeg") or {}
+    if fallback:
+        widest = max(fallback, key=int)
+        src = storage.url(fallback[widest])
+        srcset = _srcset(fallback, storage)
+    else:
+        src = image.url if image else ""
+        srcset = ""
+    return {
+        "src": src,
+        "srcset": srcset,
+        "sources": sources,
+        "sizes": sizes,
+        "alt": alt,
+        "css_class": css_class,
+        "loading": loading,
+        "width": derivatives.get("width"),
+        "height": derivatives.get("height"),
+    }
@@ -1,13 +1,42 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.template import Context, Template
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import translation
+from .cache import collections_cache_stats, get_collections
+from .images import available_formats, build_derivatives
+from .context_processors import collections_processor
 from .models import Product, Collection
+from .pagination import EstimatedCountPaginator
+from account.models import Account
 from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 import datetime
 
 
+def use_temporary_media_root(testcase):
+    """Store the files saved by testcase in a directory removed afterwards."""
+    media_root = tempfile.mkdtemp()
+    testcase.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    testcase.addCleanup(settings_override.disable)
+
+
 class CollectionModelTests(TestCase):
     def setUp(self):
         """To set up collection examples to be able to test."""
+        use_temporary_media_root(self)
         image = SimpleUploadedFile(
             name="test_image.jpg", content=b"", content_type="image/jpeg"
         )
@@ -32,6 +61,7 @@ class CollectionModelTests(TestCase):
 class ProductModelTests(TestCase):
     def setUp(self):
         """To set up different ceramic pieces to be able to test."""
+        use_temporary_media_root(self)
         image = SimpleUploadedFile(
             name="test_image.jpg", content=b"", content_type="image/jpeg"
         )
@@ -95,7 +125,370 @@ class ProductModelTests(TestCase):
         self.assertEqual(self.prod2.get_discounted_price(), 1999)
         self.assertEqual(self.prod3.get_discounted_price(), 400)
 
+    def test_discount_from_quantity(self):
+        """Should take the quantity from stock with a conditional update."""
+        self.prod1.discount_from_quantity(4)
+        self.assertEqual(self.prod1.quantity, 6)
+        self.prod1.refresh_from_db()
+        self.assertEqual(self.prod1.quantity, 6)
+
+    def test_discount_from_quantity_rejects_overselling(self):
+        """Should raise and leave stock untouched when there is not enough."""
+        with self.assertRaises(ValidationError):
+            self.prod3.discount_from_quantity(6)
+        with self.assertRaises(ValidationError):
+            self.prod3.discount_from_quantity(0)
+        self.prod3.refresh_from_db()
+        self.assertEqual(self.prod3.quantity, 5)
+
     def test_created_recently(self):
         """Should return True if the product was created recently, False otherwise."""
         self.assertTrue(self.prod3.created_recently)
         self.assertFalse(self.prod1.created_recently)
+
+
+class CollectionCacheTests(TestCase):
+    """To test the cached collection list used by the navigation."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collection = Collection.objects.create(name="Vase Collection")
+
+    def test_warm_cache_runs_no_queries(self):
+        """Should only query the database on the first call."""
+        request = self.factory.get("/")
+        with self.assertNumQueries(1):
+            collections_processor(request)
+        with self.assertNumQueries(0):
+            context = collections_processor(request)
+        self.assertEqual(context["collections"], [self.collection])
+        self.assertEqual(collections_cache_stats(), {"hits": 1, "misses": 1})
+
+    def test_cache_is_keyed_per_language(self):
+        """Should build one entry per active language."""
+        with translation.override("en"):
+            get_collections()
+        with translation.override("fr"):
+            get_collections()
+        self.assertEqual(collections_cache_stats()["misses"], 2)
+
+    def test_save_invalidates_cache(self):
+        """Should rebuild the list after a Collection is saved."""
+        get_collections()
+        with self.captureOnCommitCallbacks(execute=True):
+            Collection.objects.create(name="Mug Collection")
+        with self.assertNumQueries(1):
+            collections = get_collections()
+        self.assertEqual(len(collections), 2)
+
+    def test_delete_invalidates_cache(self):
+        """Should rebuild the list after a Collection is deleted."""
+        get_collections()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collection.delete()
+        self.assertEqual(get_collections(), [])
+
+
+@override_settings(SHOP_PAGE_SIZE=2)
+class CollectionViewPaginationTests(TestCase):
+    """To test the keyset pagination of the collection page."""
+
+    def setUp(self):
+        cache.clear()
+        self.collection = Collection.objects.create(
+            name="Vase Collection", image="collections/vases.jpg"
+        )
+        now = timezone.now()
+        self.products = [
+            Product.objects.create(
+                name=f"Vase {i}",
+                created_date=now - datetime.timedelta(days=i),
+                collection=self.collection,
+            )
+            for i in range(5)
+        ]
+        self.url = reverse("shop:collection", args=[self.collection.id])
+
+    def test_pages_follow_newest_first(self):
+        """Should walk every product once, newest first, following the cursor."""
+        seen = []
+        response = self.client.get(self.url)
+        while True:
+            seen += response.context["products"]
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+            response = self.client.get(self.url, {"after": cursor})
+        self.assertEqual(seen, self.products)
+
+    def test_ties_on_created_date_are_broken_by_id(self):
+        """Should not skip products sharing the same created_date."""
+        Product.objects.update(created_date=timezone.now())
+        first = self.client.get(self.url)
+        second = self.client.get(self.url, {"after": first.context["next_cursor"]})
+        ids = [p.id for p in first.context["products"] + second.context["products"]]
+        self.assertEqual(ids, sorted((p.id for p in self.products), reverse=True)[:4])
+
+    def test_deep_page_runs_same_queries_as_first(self):
+        """Should not cost more queries to render a later page."""
+        get_collections()
+        first = self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {"after": first.context["next_cursor"]})
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url, {"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductAdminChangelistTests(TestCase):
+    """Test the product changelist stays at a fixed query count at 100k rows."""
+
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Account.objects.create_superuser(
+            username="admin", email="[email protected]", password="testpass123"
+        )
+        cls.collection = Collection.objects.create(name="Default")
+        Product.objects.bulk_create(
+            Product(name=f"Piece {i}", collection=cls.collection)
+            for i in range(cls.ROWS)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertChangelistQueries(self, model, num, params=None):
+        url = reverse(f"admin:shop_{model}_changelist")
+        self.client.get(url, params)
+        with self.assertNumQueries(num):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+    def test_product_changelist_estimates_the_count(self):
+        # Session, user, estimated count, page and the collection filter.
+        self.assertChangelistQueries("product", 5)
+
+    def test_product_changelist_filtered_by_collection(self):
+        self.assertChangelistQueries(
+            "product", 5, {"collection__id__exact": self.collection.pk}
+        )
+
+    def test_product_search_matches_the_whole_name(self):
+        url = reverse("admin:shop_product_changelist")
+        response = self.client.get(url, {"q": '"piece 7"'})
+        self.assertEqual(
+            [product.name for product in response.context["cl"].result_list],
+            ["Piece 7"],
+        )
+        # The search is counted exactly in place of the estimate.
+        self.assertChangelistQueries("product", 5, {"q": '"piece 7"'})
+
+    def test_collection_changelist(self):
+        # Collections are few, so the default exact and full counts are kept.
+        self.assertChangelistQueries("collection", 5)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        self.collection = Collection.objects.create(name="Default")
+        Product.objects.bulk_create(
+            Product(name=f"Piece {i}", collection=self.collection) for i in range(5)
+        )
+
+    def test_small_tables_are_counted_exactly(self):
+        Product.objects.filter(name="Piece 0").delete()
+        paginator = EstimatedCountPaginator(Product.objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 4)
+
+    def test_large_tables_use_the_estimate(self):
+        Product.objects.filter(name="Piece 0").delete()
+        with patch.object(EstimatedCountPaginator, "ESTIMATE_THRESHOLD", 2):
+            paginator = EstimatedCountPaginator(Product.objects.order_by("pk"), 2)
+            self.assertEqual(paginator.count, Product.objects.latest("pk").pk)
+
+    def test_filtered_querysets_are_counted_exactly(self):
+        with patch.object(EstimatedCountPaginator, "ESTIMATE_THRESHOLD", 2):
+            paginator = EstimatedCountPaginator(
+                Product.objects.filter(name="Piece 1").order_by("pk"), 2
+            )
+            self.assertEqual(paginator.count, 1)
+
+
+class StylesheetTests(TestCase):
+    def test_pages_link_the_compiled_stylesheet(self):
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, 'href="/static/css/site.css"')
+        self.assertNotContains(response, "cdn.tailwindcss.com")
+
+
+def jpeg_upload(name, width=1000, height=750, color="orange"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        use_temporary_media_root(self)
+        self.collection = Collection.objects.create(name="Default collection")
+
+    def create_product(self, **kwargs):
+        product = Product.objects.create(
+            name="Mug", collection=self.collection, **kwargs
+        )
+        call_command("build_image_derivatives", workers=1, stdout=io.StringIO())
+        product.refresh_from_db()
+        return product
+
+    def render(self, product):
+        template = Template(
+            "{% load responsive_images %}"
+            '{% responsive_image product sizes="50vw" alt=product.name %}'
+        )
+        return template.render(Context({"product": product}))
+
+    def test_upload_builds_width_stepped_derivatives(self):
+        product = self.create_product(image=jpeg_upload("mug.jpg"))
+        derivatives = product.image_derivatives
+        self.assertEqual(derivatives["source"], product.image.name)
+        self.assertEqual((derivatives["width"], derivatives["height"]), (1000, 750))
+        self.assertEqual(list(derivatives["formats"]), available_formats())
+        for names in derivatives["formats"].values():
+            self.assertEqual(list(names), ["320", "640", "960", "1000"])
+            for name in names.values():
+                self.assertTrue(default_storage.exists(name))
+        with default_storage.open(derivatives["formats"]["jpeg"]["320"]) as f:
+            self.assertEqual(Image.open(f).size, (320, 240))
+
+    def test_small_originals_are_not_upscaled(self):
+        product = self.create_product(image=jpeg_upload("mug.jpg", 200, 100))
+        self.assertEqual(list(product.image_derivatives["formats"]["jpeg"]), ["200"])
+
+    def test_large_originals_stop_at_the_widest_step(self):
+        product = self.create_product(image=jpeg_upload("mug.jpg", 2400, 100))
+        self.assertEqual(
+            list(product.image_derivatives["formats"]["jpeg"]),
+            ["320", "640", "960", "1280", "1920"],
+        )
+
+    def test_replacing_the_image_keeps_the_old_derivatives(self):
+        product = self.create_product(image=jpeg_upload("mug.jpg"))
+        old = product.image_derivatives["formats"]["jpeg"]["320"]
+        product.image = jpeg_upload("plate.jpg", color="blue")
+        product.save()
+        call_command("build_image_derivatives", workers=1, stdout=io.StringIO())
+        product.refresh_from_db()
+        self.assertTrue(default_storage.exists(old))
+        self.assertIn("plate", product.image_derivatives["formats"]["jpeg"]["320"])
+
+    def test_saving_a_new_image_builds_nothing_until_the_backfill(self):
+        product = self.create_product(image=jpeg_upload("mug.jpg"))
+        product.image = jpeg_upload("plate.jpg", color="blue")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        self.assertIn("mug", product.image_derivatives["source"])
+        html = self.render(product)
+        self.assertIn(f'src="/media/{product.image.name}"', html)
+        self.assertNotIn("srcset", html)
+
+    def test_tag_renders_a_picture_with_srcset_and_sizes(self):
+        product = self.create_product(image=jpeg_upload("mug.jpg"))
+        html = self.render(product)
+        self.assertIn('<source type="image/webp" srcset="/media/products/mug', html)
+        self.assertIn("320w, /media/products/mug", html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('width="1000" height="750"', html)
+        self.assertIn('alt="Mug"', html)
+
+    def test_tag_falls_back_to_the_original(self):
+        product = Product.objects.create(
+            name="Mug", collection=self.collection, image="products/missing.jpg"
+        )
+        html = self.render(product)
+        self.assertIn('src="/media/products/missing.jpg"', html)
+        self.assertNotIn("srcset", html)
+
+    def test_backfill_builds_derivatives_once(self):
+        default_storage.save("products/old.jpg", jpeg_upload("old.jpg"))
+        default_storage.save("products/notes.jpg", ContentFile(b"not an image"))
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name="Old", collection=self.collection, image="products/old.jpg"
+                ),
+                Product(
+                    name="Notes", collection=self.collection, image="products/notes.jpg"
+                ),
+            ]
+        )
+        out = io.StringIO()
+        call_command("build_image_derivatives", workers=1, stdout=out)
+        self.assertIn("Built derivatives for 1 images, 1 not images", out.getvalue())
+        old = Product.objects.get(name="Old")
+        self.assertIn("jpeg", old.image_derivatives["formats"])
+        self.assertEqual(
+            Product.objects.get(name="Notes").image_derivatives["formats"], {}
+        )
+
+        call_command("build_image_derivatives", workers=1, stdout=out)
+        self.assertIn("Built derivatives for 0 images, 0 not images", out.getvalue())
+
+    def test_backfill_retries_missing_originals(self):
+        Product.objects.create(
+            name="Gone", collection=self.collection, image="products/gone.jpg"
+        )
+        out = io.StringIO()
+        with self.assertLogs(level="ERROR"):
+            call_command("build_image_derivatives", workers=1, stdout=out)
+        self.assertIn("0 not images, 1 failed", out.getvalue())
+        self.assertEqual(Product.objects.get(name="Gone").image_derivatives, {})
+
+    def test_backfill_saves_each_image_and_skips_failures(self):
+        for name in ("a.jpg", "b.jpg"):
+            default_storage.save(f"products/{name}", jpeg_upload(name))
+        Product.objects.bulk_create(
+            Product(name=name, collection=self.collection, image=f"products/{name}")
+            for name in ("a.jpg", "b.jpg")
+        )
+        build = "shop.management.commands.build_image_derivatives.build_derivatives"
+        real_build = build_derivatives
+
+        def fail_on_a(storage, name):
+            if name == "products/a.jpg":
+                raise OSError("S3 down")
+            return real_build(storage, name)
+
+        out = io.StringIO()
+        with patch(build, side_effect=fail_on_a), self.assertLogs(level="ERROR"):
+            call_command("build_image_derivatives", workers=1, stdout=out)
+        self.assertIn("Built derivatives for 1 images, 0 not images", out.getvalue())
+        self.assertIn("1 failed", out.getvalue())
+        self.assertEqual(Product.objects.get(name="a.jpg").image_derivatives, {})
+        self.assertIn(
+            "jpeg", Product.objects.get(name="b.jpg").image_derivatives["formats"]
+        )
+
+        call_command("build_image_derivatives", workers=1, stdout=out)
+        self.assertIn(
+            "jpeg", Product.objects.get(name="a.jpg").image_derivatives["formats"]
+        )
+
+    def test_backfill_runs_in_a_process_pool(self):
+        for name in ("a.jpg", "b.jpg"):
+            default_storage.save(f"products/{name}", jpeg_upload(name))
+        Product.objects.bulk_create(
+            Product(name=name, collection=self.collection, image=f"products/{name}")
+            for name in ("a.jpg", "b.jpg")
+        )
+        call_command("build_image_derivatives", workers=2, stdout=io.StringIO())
+        for product in Product.objects.all():
+            for name in product.image_derivatives["formats"]["webp"].values():
+                self.assertTrue(
+                    os.path.exists(os.path.join(default_storage.location, name))
+                )
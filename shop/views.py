@@ -1,5 +1,17 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404, render
 from .models import Collection, Product
+from .pagination import paginate_keyset
+
+PRODUCT_CARD_FIELDS = [
+    "id",
+    "name",
+    "description",
+    "image",
+    "image_derivatives",
+    "created_date",
+    "collection",
+]
 
 
 def shop(request):
@@ -8,12 +20,19 @@ def shop(request):
 
 
 def collection(request, collection_id):
-    """Display a single Collection, showing the different products in that collection."""
+    """Display a single Collection, showing one page of its products."""
     collection = get_object_or_404(Collection, id=collection_id)
-    products = collection.product_set.all()
+    products = collection.product_set.only(*PRODUCT_CARD_FIELDS)
+    page = paginate_keyset(
+        products,
+        "created_date",
+        request.GET.get("after"),
+        getattr(settings, "SHOP_PAGE_SIZE", 12),
+    )
     context = {
         "collection": collection,
-        "products": products,
+        "products": page.items,
+        "next_cursor": page.next_cursor,
     }
     return render(request, "shop/collection.html", context)
 